@@ -0,0 +1,260 @@
+import asyncio
+import random
+import re
+import sys
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+
+# 🔹 Общий HTTP-клиент для Autodesk API (Data Management, Model Derivative, Admin).
+# Один лимитер на семейство API, повторы с экспоненциальной задержкой и учётом Retry-After,
+# статистика задержек по эндпоинтам.
+
+# Семейство API -> (стартовая скорость, потолок), запросов в секунду.
+# Скорость адаптивная: растёт понемногу после успешных ответов и делится пополам на 429.
+RATE_LIMITS = {
+    "data": (5.0, 20.0),
+    "derivative": (5.0, 20.0),
+    "admin": (1.0, 5.0),
+    "default": (5.0, 20.0),
+}
+BURST = 10  # Сколько запросов можно отправить разом после простоя
+
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 1.0  # Секунды; задержка = BACKOFF_BASE * 2^(попытка-1) со случайным разбросом
+BACKOFF_MAX = 60.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+MAX_CONCURRENCY = 16  # Общий лимит одновременных запросов (configure() меняет)
+
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]  # Границы гистограммы, секунды
+
+stats = {"requests": 0, "retries": 0, "errors": 0, "throttled": 0}
+
+
+class TokenBucket:
+    """Token bucket с адаптивной скоростью (AIMD) для одного семейства API."""
+
+    def __init__(self, rate, max_rate, capacity=BURST):
+        self.rate = rate
+        self.min_rate = rate / 10
+        self.max_rate = max_rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def reward(self):
+        """Успешный ответ — понемногу поднимаем скорость до потолка."""
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 100)
+
+    def penalize(self, pause):
+        """429 — скорость пополам, и всё семейство ждёт, пока сервер не разрешит снова."""
+        now = time.monotonic()
+        if now >= self.blocked_until:
+            # Ответы 429 на запросы, ушедшие до паузы, повторно скорость не режут
+            self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0
+        self.blocked_until = max(self.blocked_until, now + pause)
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.statuses = Counter()
+
+    def observe(self, seconds, status):
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.statuses[status] += 1
+
+    def quantile(self, q):
+        """Верхняя граница корзины, в которую попадает квантиль q."""
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS + [float("inf")], self.buckets):
+            seen += n
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+_buckets = {}
+_histograms = defaultdict(LatencyHistogram)
+_semaphore = None
+
+
+def configure(concurrency=None, rates=None):
+    """Меняет общий лимит параллельных запросов и/или скорости семейств (до первых запросов)."""
+    global MAX_CONCURRENCY, _semaphore
+    if concurrency:
+        MAX_CONCURRENCY = concurrency
+        _semaphore = None
+    if rates:
+        RATE_LIMITS.update(rates)
+        _buckets.clear()
+
+
+def api_family(url):
+    if "/modelderivative/" in url:
+        return "derivative"
+    if "/project/v1/" in url or "/data/v1/" in url:
+        return "data"
+    if "/admin/v1/" in url:
+        return "admin"
+    return "default"
+
+
+def endpoint_key(method, url):
+    """URL -> шаблон эндпоинта: идентификаторы (URN, GUID, id) заменяются на {id}."""
+    path = url.split("://", 1)[-1].split("?", 1)[0]
+    segments = path.split("/")[1:]
+    template = "/".join(
+        s if re.fullmatch(r"[A-Za-z_-]+|v\d+", s) else "{id}"
+        for s in segments
+    )
+    return f"{method} /{template}"
+
+
+def _bucket(family):
+    if family not in _buckets:
+        rate, max_rate = RATE_LIMITS.get(family, RATE_LIMITS["default"])
+        _buckets[family] = TokenBucket(rate, max_rate)
+    return _buckets[family]
+
+
+def _get_semaphore():
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _semaphore
+
+
+def retry_after_seconds(value):
+    """Заголовок Retry-After: число секунд или HTTP-дата. None, если разобрать нельзя."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt):
+    """Экспоненциальная задержка с полным случайным разбросом (full jitter)."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+async def request(session, method, url, headers, description, **kwargs):
+    """Запрос с лимитером и повторами. Возвращает (status, json | None); status=None — сеть недоступна."""
+    family = api_family(url)
+    bucket = _bucket(family)
+    histogram = _histograms[endpoint_key(method, url)]
+    status = None
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        print(f"🔹 {description} -> {url} (Попытка {attempt})")
+        await bucket.acquire()
+        retry_after = None
+        started = time.perf_counter()
+        try:
+            # Слот держим только на время самого запроса — паузы между попытками его не занимают
+            async with _get_semaphore():
+                stats["requests"] += 1
+                async with session.request(method, url, headers=headers, **kwargs) as response:
+                    status = response.status
+                    retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+                    data = None
+                    if status < 300 and response.content_length != 0:
+                        try:
+                            data = await response.json(content_type=None)
+                        except ValueError:
+                            data = None  # Пустое или не-JSON тело (например, 202 без содержимого)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            histogram.observe(time.perf_counter() - started, "error")
+            print(f"⚠️ Сетевая ошибка при {description}: {e!r}")
+            status = None
+        else:
+            histogram.observe(time.perf_counter() - started, status)
+            if status < 300:
+                bucket.reward()
+                return status, data
+            if status not in RETRY_STATUSES:
+                stats["errors"] += 1
+                print(f"❌ Ошибка ({status}) при {description}")
+                return status, None
+
+        if attempt == MAX_ATTEMPTS:
+            break
+        delay = retry_after if retry_after is not None else backoff_delay(attempt)
+        stats["retries"] += 1
+        if status == 429:
+            stats["throttled"] += 1
+            bucket.penalize(delay)
+            print(f"⚠️ Ошибка 429 ({family}): скорость снижена до {bucket.rate:.1f} запр/сек, ждём {delay:.1f} сек...")
+        else:
+            print(f"⚠️ Ошибка ({status or 'сеть'}) при {description}, повтор через {delay:.1f} сек...")
+        await asyncio.sleep(delay)
+
+    stats["errors"] += 1
+    print(f"❌ Не удалось после {MAX_ATTEMPTS} попыток: {description}")
+    return status, None
+
+
+async def fetch(session, url, headers, description):
+    """GET -> JSON (только при 200, как раньше в скриптах), иначе None."""
+    status, data = await request(session, "GET", url, headers, description)
+    return data if status == 200 else None
+
+
+def print_report():
+    """Сводка по эндпоинтам: число запросов, среднее, p50/p95 (по границам корзин), коды ответов."""
+    if not _histograms:
+        return
+    print("📊 Задержки по эндпоинтам:")
+    for key, h in sorted(_histograms.items(), key=lambda item: -item[1].count):
+        statuses = ", ".join(f"{s}: {n}" for s, n in sorted(h.statuses.items(), key=str))
+        print(
+            f"   {key}: {h.count} запр., среднее {h.total / h.count:.3f} с, "
+            f"p50 ≤ {h.quantile(0.5)} с, p95 ≤ {h.quantile(0.95)} с ({statuses})"
+        )
+    for family, bucket in _buckets.items():
+        print(f"   ⏱️ {family}: текущая скорость {bucket.rate:.1f} запр/сек")
+    print(
+        f"   Всего запросов: {stats['requests']}, повторов: {stats['retries']} "
+        f"(из них 429: {stats['throttled']}), ошибок: {stats['errors']}"
+    )
+
+
+def arg_value(name, default=None):
+    """Значение флага вида --name=value из командной строки."""
+    for arg in sys.argv[1:]:
+        if arg.startswith(f"--{name}="):
+            return arg.split("=", 1)[1]
+    return default
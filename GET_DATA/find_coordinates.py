@@ -1,11 +1,20 @@
 import os
+import sys
+import time
 import fitz
+import hashlib
 import json
 import sqlite3
 import re
+from concurrent.futures import ProcessPoolExecutor
+
+from geo import itm_to_wgs84
 
 HUB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "BIMW_-_WXG_Group"))
 
+# 🔹 Строк от заголовка "N/S" до значения угла включительно (N/S, E/W, Elev, Angle, затем 4 значения)
+COORDINATE_TABLE_LINES = 8
+
 
 # 🔹 Выбор проекта
 def choose_project():
@@ -28,20 +37,57 @@ def clean_number(value):
     cleaned = re.sub(r"[^\d\.\-]", "", value.replace(",", ".")).strip()
     return cleaned  # НЕ преобразуем в float!
 
-# 🔹 Извлечение координат
-def extract_coordinates(pdf_path):
+# 🔹 Разделы BEP, страницы которых запоминаются в индексе: имя -> регулярное выражение по тексту страницы
+# (раздел добавляется сюда вместе с кодом, который его читает)
+BEP_MARKERS = {
+    "coordinates": r"^N/S$",             # Таблица Project Base Point
+}
+
+# 🔹 Индекс страниц BEP: {"page_count", "scanned" — сколько страниц с начала уже просмотрено, "pages": {раздел: [номера]}}
+def new_page_index():
+    return {"page_count": None, "scanned": 0, "pages": {name: [] for name in BEP_MARKERS}}
+
+def section_pages(doc, index, name):
+    """Страницы раздела из индекса; если раздел ещё не встречался — документ дочитывается
+    с первой непросмотренной страницы до его первого вхождения, попутно отмечая все разделы."""
+    index["page_count"] = len(doc)
+    if index["pages"][name]:
+        return index["pages"][name]
+    patterns = {marker: re.compile(pattern, re.MULTILINE) for marker, pattern in BEP_MARKERS.items()}
+    while index["scanned"] < len(doc) and not index["pages"][name]:
+        number = index["scanned"]
+        text = doc[number].get_text("text")
+        for marker, pattern in patterns.items():
+            if pattern.search(text):
+                index["pages"][marker].append(number)
+        index["scanned"] += 1
+    return index["pages"][name]
+
+# 🔹 Извлечение координат: читаются только страницы таблицы из индекса (или по порядку до неё)
+def extract_coordinates(pdf_path, index):
     doc = fitz.open(pdf_path)
-    lines = []
-    for page in doc:
-        lines.extend(page.get_text("text").splitlines())
-    doc.close()
+    lines = None  # Строки начиная с "N/S" (другие страницы не храним)
+    try:
+        for number in section_pages(doc, index, "coordinates"):
+            page_lines = doc[number].get_text("text").splitlines()
+            if "N/S" not in page_lines:
+                continue
+            lines = page_lines[page_lines.index("N/S"):]
+            following = number + 1
+            while len(lines) < COORDINATE_TABLE_LINES and following < len(doc):
+                lines.extend(doc[following].get_text("text").splitlines())  # Таблица перенесена на следующую страницу
+                following += 1
+            break
+    finally:
+        doc.close()
 
     try:
-        ns_index = lines.index("N/S")
-        ns = lines[ns_index + 4].strip()
-        ew = lines[ns_index + 5].strip()
-        elev = lines[ns_index + 6].strip()
-        angle = lines[ns_index + 7].strip()
+        if lines is None:
+            raise ValueError("таблица N/S не найдена")
+        ns = lines[4].strip()
+        ew = lines[5].strip()
+        elev = lines[6].strip()
+        angle = lines[7].strip()
 
         return {
             "north_south": clean_number(ns),
@@ -54,6 +100,86 @@ def extract_coordinates(pdf_path):
         print("❌ Ошибка при чтении координат:", e)
         return None
 
+def load_page_index(project_path, digest):
+    """Индекс страниц для хэша файла из базы проекта (или новый, пустой)."""
+    conn = open_bep_state(project_path)
+    try:
+        row = conn.execute(
+            "SELECT page_count, scanned, markers, pages FROM bep_page_index WHERE file_hash = ?", (digest,)
+        ).fetchone()
+    finally:
+        conn.close()
+    # Индекс, построенный с другим набором разделов (или до появления scanned), начинается заново
+    if not row or row[1] is None or json.loads(row[2]) != BEP_MARKERS:
+        return new_page_index()
+    return {"page_count": row[0], "scanned": row[1], "pages": json.loads(row[3])}
+
+def save_page_index(project_path, digest, index):
+    conn = open_bep_state(project_path)
+    try:
+        conn.execute("""
+        INSERT INTO bep_page_index (file_hash, page_count, scanned, markers, pages) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(file_hash) DO UPDATE SET
+            page_count = excluded.page_count, scanned = excluded.scanned,
+            markers = excluded.markers, pages = excluded.pages
+        """, (
+            digest, index["page_count"], index["scanned"],
+            json.dumps(BEP_MARKERS, ensure_ascii=False), json.dumps(index["pages"]),
+        ))
+        conn.commit()
+    finally:
+        conn.close()
+
+# 🔹 Хэш содержимого PDF: неизменившиеся BEP повторно не разбираются
+def file_hash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def open_bep_state(project_path):
+    conn = sqlite3.connect(os.path.join(project_path, "project_data.sqlite"))
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS bep_files (
+        pdf_name TEXT PRIMARY KEY,
+        file_hash TEXT,
+        processed_at TEXT
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS bep_page_index (
+        file_hash TEXT PRIMARY KEY,
+        page_count INTEGER,
+        scanned INTEGER,
+        markers TEXT,
+        pages TEXT
+    )
+    """)
+    # Индексы, созданные до появления scanned
+    if "scanned" not in {row[1] for row in conn.execute("PRAGMA table_info(bep_page_index)")}:
+        conn.execute("ALTER TABLE bep_page_index ADD COLUMN scanned INTEGER")
+    return conn
+
+def bep_unchanged(project_path, pdf_name, digest):
+    conn = open_bep_state(project_path)
+    try:
+        row = conn.execute("SELECT file_hash FROM bep_files WHERE pdf_name = ?", (pdf_name,)).fetchone()
+    finally:
+        conn.close()
+    return bool(row) and row[0] == digest
+
+def save_bep_state(project_path, pdf_name, digest):
+    conn = open_bep_state(project_path)
+    try:
+        conn.execute("""
+        INSERT INTO bep_files (pdf_name, file_hash, processed_at) VALUES (?, ?, ?)
+        ON CONFLICT(pdf_name) DO UPDATE SET file_hash = excluded.file_hash, processed_at = excluded.processed_at
+        """, (pdf_name, digest, time.strftime("%Y-%m-%dT%H:%M:%S")))
+        conn.commit()
+    finally:
+        conn.close()
+
 # 🔹 Сохранение в JSON
 def save_json(project_path, new_data):
     out_path = os.path.join(project_path, "project_coordinates.json")
@@ -91,10 +217,18 @@ def save_to_sqlite(project_path, project_name, data):
         north_south TEXT,
         east_west TEXT,
         elevation TEXT,
-        angle_to_true_north TEXT
+        angle_to_true_north TEXT,
+        latitude REAL,
+        longitude REAL
     )
     """)
 
+    # Базы, созданные до появления WGS84-столбцов
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(project_coordinates)")}
+    for column in ("latitude", "longitude"):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE project_coordinates ADD COLUMN {column} REAL")
+
     # Проверка на наличие идентичной записи
     cursor.execute("""
     SELECT 1 FROM project_coordinates
@@ -132,27 +266,81 @@ def save_to_sqlite(project_path, project_name, data):
             data["elevation"],
             data["angle_to_true_north"]
         ))
-        conn.commit()
         print(f"✅ Новые координаты добавлены в базу: {db_path}")
 
+    # 🌍 WGS84 считается один раз здесь, пакетно для всех строк без lat/lon
+    fill_wgs84(cursor)
+    conn.commit()
+
     conn.close()
 
-# 🚀 Основной запуск
-def main():
-    project_name = choose_project()
+# 🔹 Досчитывает latitude/longitude для строк, где их ещё нет
+def fill_wgs84(cursor):
+    rows = cursor.execute("""
+    SELECT id, north_south, east_west FROM project_coordinates
+    WHERE latitude IS NULL OR longitude IS NULL
+    """).fetchall()
+    if not rows:
+        return
+
+    points = itm_to_wgs84([r[1] for r in rows], [r[2] for r in rows])
+    cursor.executemany("""
+    UPDATE project_coordinates SET latitude = ?, longitude = ? WHERE id = ?
+    """, [(p[0], p[1], r[0]) for r, p in zip(rows, points) if p])
+
+# 🔹 Один проект целиком (выполняется в отдельном процессе в пакетном режиме)
+def process_project(project_name, force=False):
+    """Возвращает (проект, состояние): нет BEP / без изменений / координаты / ошибка."""
     project_path = os.path.join(HUB_PATH, project_name)
     pdf_path = find_bep_file(project_path)
-
     if not pdf_path:
-        print("❌ BEP-файл не найден в проекте.")
-        return
+        return project_name, "BEP-файл не найден"
+
+    pdf_name = os.path.basename(pdf_path)
+    digest = file_hash(pdf_path)
+    if not force and bep_unchanged(project_path, pdf_name, digest):
+        return project_name, f"{pdf_name} без изменений"
 
     print(f"📄 Найден файл: {pdf_path}")
-    coordinates = extract_coordinates(pdf_path)
+    index = load_page_index(project_path, digest)
+    scanned = index["scanned"]
+    coordinates = extract_coordinates(pdf_path, index)
+    if index["scanned"] != scanned:
+        save_page_index(project_path, digest, index)
+        print(f"📑 Индекс страниц {pdf_name}: просмотрено {index['scanned']} из {index['page_count']} стр. -> {index['pages']}")
+    if not coordinates:
+        return project_name, f"{pdf_name}: координаты не найдены"
+
+    save_json(project_path, coordinates)
+    save_to_sqlite(project_path, project_name, coordinates)
+    save_bep_state(project_path, pdf_name, digest)
+    return project_name, f"{pdf_name}: N/S {coordinates['north_south']}, E/W {coordinates['east_west']}"
+
+# 🔹 Все проекты хаба без вопросов: каждый BEP разбирается в своём процессе
+def process_all(workers=None, force=False):
+    projects = [p for p in os.listdir(HUB_PATH) if os.path.isdir(os.path.join(HUB_PATH, p))]
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {project: pool.submit(process_project, project, force) for project in projects}
+        for project, future in futures.items():
+            try:
+                _, state = future.result()
+                print(f"✅ {project}: {state}")
+            except Exception as e:
+                print(f"❌ Ошибка в проекте {project}: {e}")
+    print(f"🏁 Обработано проектов: {len(projects)} за {time.perf_counter() - started:.1f} сек")
 
-    if coordinates:
-        save_json(project_path, coordinates)
-        save_to_sqlite(project_path, project_name, coordinates)
+# 🚀 Основной запуск
+def main():
+    force = "--force" in sys.argv  # Разобрать BEP, даже если файл не менялся
+    if "--all" in sys.argv:
+        workers = next((int(a.split("=", 1)[1]) for a in sys.argv[1:] if a.startswith("--workers=")), None)
+        process_all(workers, force)
+        return
+
+    project_name = choose_project()
+    project_name, state = process_project(project_name, force)
+    print(f"ℹ️ {project_name}: {state}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,35 @@
+import numpy as np
+from pyproj import Transformer
+
+# 🌍 Israeli TM Grid (EPSG:2039) -> WGS84 (EPSG:4326)
+transformer = Transformer.from_crs("EPSG:2039", "EPSG:4326", always_xy=True)
+
+
+def parse_itm(value):
+    """Строка из BEP ("63484489,961") -> float в метрах ITM; NaN, если не число."""
+    try:
+        number = float(str(value).replace(",", "."))
+    except (TypeError, ValueError):
+        return float("nan")
+    # В части BEP координаты записаны без десятичной точки (в сантиметрах)
+    if number > 1_000_000:
+        number = number / 100
+    return number
+
+
+def itm_to_wgs84(north_south_values, east_west_values):
+    """Пакетно переводит списки N/S и E/W в [(lat, lon) | None, ...] одним вызовом pyproj."""
+    ns = np.array([parse_itm(v) for v in north_south_values], dtype=float)
+    ew = np.array([parse_itm(v) for v in east_west_values], dtype=float)
+    if ns.size == 0:
+        return []
+
+    lon, lat = transformer.transform(ew, ns)
+    lon = np.asarray(lon, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    valid = np.isfinite(lat) & np.isfinite(lon)
+
+    return [
+        (float(la), float(lo)) if ok else None
+        for la, lo, ok in zip(lat, lon, valid)
+    ]
@@ -2,6 +2,7 @@ import os
 import json
 import asyncio
 import aiohttp
+from aps_client import fetch, print_report
 from get_token import load_token
 
 
@@ -15,23 +16,6 @@ ACTIVITY_LOG_BIM360 = "https://developer.api.autodesk.com/bim360/admin/v1/projec
 ACTIVITY_LOG_ACC = "https://developer.api.autodesk.com/construction/admin/v1/projects/{}/activity-stream"
 
 
-async def fetch(session, url, headers, description):
-    """Асинхронный GET-запрос с обработкой ошибок."""
-    for attempt in range(1, 6):
-        print(f"🔹 {description} -> {url} (Попытка {attempt})")
-        async with session.get(url, headers=headers) as response:
-            if response.status == 200:
-                print(f"✅ Успешно: {description}")
-                return await response.json()
-            elif response.status == 429:
-                print(f"⚠️ Ошибка 429 (Слишком много запросов). Ждем {attempt * 2} секунд...")
-                await asyncio.sleep(attempt * 2)
-            else:
-                print(f"❌ Ошибка ({response.status}) при {description}")
-                return None
-    return None
-
-
 # Получение аккаунт ID для хаба
 async def get_hub_account_id(session, access_token):
     """Получает `account_id` для хаба."""
@@ -110,6 +94,7 @@ async def main():
             for project in projects["data"]:
                 await process_project(session, access_token, hub_name, project)
         print("🎉 Все проекты успешно обработаны!")
+        print_report()
 
 
 if __name__ == "__main__":
@@ -1,5 +1,7 @@
+import asyncio
 import requests
 import json
+import threading
 import time
 import os
 
@@ -12,8 +14,12 @@ AUTH_ENDPOINT = "https://developer.api.autodesk.com/authentication/v2/token"
 CURRENT_DIR = os.path.dirname(__file__)
 TOKEN_FILE = os.path.join(CURRENT_DIR, "token.json")
 
-def get_access_token():
-    """Получает новый токен и сохраняет его в файл."""
+# 🔹 За сколько секунд до expires_at токен обновляется в фоне (запросы пока получают текущий)
+REFRESH_AHEAD = 5 * 60
+
+
+def request_token():
+    """Запрос нового токена у сервера авторизации. Возвращает token_data или None."""
     print("🔹 Запрос нового access token...")
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
     payload = {
@@ -27,27 +33,122 @@ def get_access_token():
     if response.status_code == 200:
         token_data = response.json()
         token_data["expires_at"] = time.time() + token_data["expires_in"] - 60  # Немного раньше, чтобы избежать проблем
-        with open(TOKEN_FILE, "w", encoding="utf-8") as f:
-            json.dump(token_data, f, indent=4)
-        print("✅ Новый токен сохранён в token.json")
-        return token_data["access_token"]
+        return token_data
     else:
         print(f"❌ Ошибка получения токена: {response.status_code}")
         print(response.text)
         return None
 
-def load_token():
-    """Загружает сохранённый токен или получает новый, если он устарел."""
-    if os.path.exists(TOKEN_FILE):
+
+def save_token_file(token_data):
+    """Атомарная запись token.json: читатели никогда не видят файл наполовину."""
+    tmp_path = f"{TOKEN_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(token_data, f, indent=4)
+    os.replace(tmp_path, TOKEN_FILE)
+
+
+def read_token_file():
+    try:
         with open(TOKEN_FILE, "r", encoding="utf-8") as f:
-            token_data = json.load(f)
-        
-        if time.time() < token_data.get("expires_at", 0):  # Проверяем срок действия
-            print("✅ Загружен сохранённый access token")
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class TokenProvider:
+    """Токен в памяти процесса до expires_at; одновременные запросы делят одно обновление.
+
+    За REFRESH_AHEAD секунд до истечения токен обновляется в фоновом потоке, а вызывающие
+    сразу получают текущий — ждать сервер авторизации приходится только без действующего токена.
+    """
+
+    def __init__(self, fetch=request_token, refresh_ahead=REFRESH_AHEAD):
+        self.fetch = fetch
+        self.refresh_ahead = refresh_ahead
+        self._token_data = None
+        self._lock = threading.Lock()  # Удерживается на время обновления (одно обновление за раз)
+        self._background = None
+        self.stats = {"hits": 0, "refreshes": 0, "waits": 0, "errors": 0}
+
+    def _valid(self, token_data, margin=0):
+        return bool(token_data) and time.time() + margin < token_data.get("expires_at", 0)
+
+    def _refresh_locked(self):
+        token_data = self.fetch()
+        if token_data:
+            self._token_data = token_data
+            self.stats["refreshes"] += 1
+            save_token_file(token_data)
+            print("✅ Новый токен сохранён в token.json")
+        else:
+            self.stats["errors"] += 1
+        return token_data
+
+    def _refresh_in_background(self):
+        if self._background and self._background.is_alive():
+            return
+        self._background = threading.Thread(target=self.refresh, kwargs={"only_if_stale": True}, daemon=True)
+        self._background.start()
+
+    def get(self):
+        """Действующий access token (или None, если получить не удалось)."""
+        token_data = self._token_data
+        if self._valid(token_data):
+            self.stats["hits"] += 1
+            if not self._valid(token_data, self.refresh_ahead):
+                self._refresh_in_background()
+            return token_data["access_token"]
+
+        if not self._lock.acquire(blocking=False):
+            # Обновление уже идёт в другом потоке — ждём его результата
+            self.stats["waits"] += 1
+            self._lock.acquire()
+        try:
+            if not self._valid(self._token_data):
+                file_data = read_token_file()  # Токен, полученный другим процессом
+                if self._valid(file_data):
+                    self._token_data = file_data
+                    print("✅ Загружен сохранённый access token")
+                else:
+                    self._refresh_locked()
+            token_data = self._token_data
+            return token_data["access_token"] if self._valid(token_data) else None
+        finally:
+            self._lock.release()
+
+    async def get_async(self):
+        """То же, что get(), но без блокировки цикла событий на время обновления."""
+        token_data = self._token_data
+        if self._valid(token_data, self.refresh_ahead):
+            self.stats["hits"] += 1
             return token_data["access_token"]
+        return await asyncio.get_running_loop().run_in_executor(None, self.get)
+
+    def refresh(self, only_if_stale=False):
+        """Принудительно получает новый токен (only_if_stale — только если он ещё не обновлён)."""
+        with self._lock:
+            if only_if_stale and self._valid(self._token_data, self.refresh_ahead):
+                return self._token_data["access_token"]
+            token_data = self._refresh_locked()
+            return token_data["access_token"] if token_data else None
+
+    def expires_in(self):
+        token_data = self._token_data
+        return max(0, int(token_data["expires_at"] - time.time())) if token_data else 0
+
 
-    # Если токен отсутствует или устарел — получаем новый
-    return get_access_token()
+# 🔹 Общий провайдер процесса (бэкенд и скрипты GET_DATA)
+token_provider = TokenProvider()
+
+
+def get_access_token():
+    """Получает новый токен и сохраняет его в файл."""
+    return token_provider.refresh()
+
+def load_token():
+    """Загружает сохранённый токен или получает новый, если он устарел."""
+    return token_provider.get()
 
 if __name__ == "__main__":
     print("🔄 Текущий токен:", load_token())
\ No newline at end of file
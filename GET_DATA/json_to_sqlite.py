@@ -1,37 +1,569 @@
 import sqlite3
 import os
+import sys
 import json
+import re
+import time
+import hashlib
+import zlib
 
-def extract_elements(cursor, view_id, objects):
+try:
+    import ijson  # Потоковый (событийный) JSON-парсер
+except ImportError:
+    ijson = None
+
+try:
+    import zstandard  # Сжатие блобов; без него — zlib
+except ImportError:
+    zstandard = None
+
+BATCH_SIZE = 5000  # Строк в одной транзакции executemany
+STREAM_THRESHOLD = 100 * 1024 * 1024  # Файлы больше этого размера читаются потоково
+
+# 🔹 Уникальные ключи: повторная загрузка обновляет строки, а не дублирует их
+UNIQUE_INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_rvt_files_version ON rvt_files (file_id, version_number)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_views_file_version_name ON views (file_name, version_number, view_name)",
+]
+
+# 🔹 Индексы строятся после массовой вставки (так быстрее, чем поддерживать их на каждый INSERT)
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_elements_view_object ON elements (view_id, object_id)",
+    "CREATE INDEX IF NOT EXISTS idx_properties_view_object ON properties (view_id, object_id)",
+    "CREATE INDEX IF NOT EXISTS idx_properties_view_external ON properties (view_id, external_id)",
+    "CREATE INDEX IF NOT EXISTS idx_property_values_object ON property_values (view_id, object_id)",
+    "CREATE INDEX IF NOT EXISTS idx_property_values_text ON property_values (name_id, value_text)",
+    "CREATE INDEX IF NOT EXISTS idx_property_values_num ON property_values (name_id, value_num)",
+]
+
+# 🔹 Столбцы properties (без view_id); raw_json — всегда последний
+PROPERTY_COLUMNS = ["object_id", "external_id", "content_hash", "raw_json"]
+
+# 🔹 Какие таблицы хранят строки вида для каждого источника (чистятся при перезаливке вида)
+VIEW_TABLES = {
+    "elements": ["elements"],
+    "properties": ["properties", "property_values"],
+}
+
+# 🔹 Хранилище блобов: raw_json объектов сжимается и хранится один раз на хэш содержимого
+BLOB_CODEC = "zstd" if zstandard else "zlib"
+ZSTD_LEVEL = 3  # Выше уровень — заметно медленнее при почти том же размере мелких JSON
+
+# 🔹 Дисциплина по имени файла (NIC_AR_Kitchen.rvt -> AR)
+DISCIPLINES = ["AR", "ST", "MEP", "EL", "HVAC", "SAN", "COORD"]
+
+# Число в начале значения свойства: "2.5 m^2" -> 2.5, "3000 mm" -> 3000
+NUMBER_PATTERN = re.compile(r"^\s*(-?\d+(?:[.,]\d+)?(?:[eE][-+]?\d+)?)(?:\s|$)")
+
+
+class RowBuffer:
+    """Копит строки одной таблицы и сбрасывает их через executemany пачками по BATCH_SIZE."""
+
+    def __init__(self, conn, table, columns, batch_size=BATCH_SIZE, on_conflict=""):
+        self.conn = conn
+        self.table = table
+        self.sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) {on_conflict}"
+        self.batch_size = batch_size
+        self.rows = []
+        self.count = 0
+        self.started = time.perf_counter()
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        self.conn.executemany(self.sql, self.rows)
+        self.conn.commit()
+        self.count += len(self.rows)
+        self.rows = []
+
+    def close(self):
+        """Сбрасывает остаток и печатает пропускную способность."""
+        self.flush()
+        elapsed = time.perf_counter() - self.started
+        rate = self.count / elapsed if elapsed > 0 else 0
+        print(f"📊 {self.table}: {self.count} строк за {elapsed:.2f} сек ({rate:.0f} строк/сек)")
+        return self.count
+
+
+def iter_view_objects(path, list_key, children_key=None):
+    """Потоково обходит {view_key: {"data": {"data": {list_key: [...]}}}} и отдаёт (view_key, obj).
+
+    Объекты строятся по одному; вложенный массив children_key в объект не
+    попадает — его элементы отдаются отдельно (раньше родителя, как только закроются),
+    поэтому в памяти только цепочка открытых предков, а не всё дерево вида.
+    """
+    path_stack = []  # Текущий путь: ключ для словарей, "item" для массивов
+    frames = []      # Открытые объекты: (глубина, ObjectBuilder)
+
+    def is_object_position():
+        if len(path_stack) < 5 or path_stack[1:5] != ["data", "data", list_key, "item"]:
+            return False
+        tail = path_stack[5:]
+        return len(tail) % 2 == 0 and all(
+            tail[i] == children_key and tail[i + 1] == "item" for i in range(0, len(tail), 2)
+        )
+
+    with open(path, "rb") as f:
+        for event, value in ijson.basic_parse(f, use_float=True):
+            if event == "map_key":
+                path_stack[-1] = value
+
+            depth = frames[-1][0] if frames else None
+
+            if frames and event == "end_map" and len(path_stack) == depth + 1:
+                # Конец текущего объекта
+                frames[-1][1].event(event, value)
+                path_stack.pop()
+                yield path_stack[0], frames.pop()[1].value
+                continue
+
+            if event == "start_map" and is_object_position():
+                frames.append((len(path_stack), ijson.ObjectBuilder()))
+                frames[-1][1].event(event, value)
+            elif frames and not (children_key and path_stack[depth] == children_key):
+                frames[-1][1].event(event, value)
+
+            if event == "start_map":
+                path_stack.append(None)
+            elif event == "start_array":
+                path_stack.append("item")
+            elif event in ("end_map", "end_array"):
+                path_stack.pop()
+
+
+def use_streaming(path, stream):
+    """stream=None — решаем по размеру файла."""
+    if stream is None:
+        stream = os.path.getsize(path) > STREAM_THRESHOLD
+    if stream and ijson is None:
+        print("⚠️ ijson не установлен — файл будет прочитан целиком")
+        return False
+    return stream
+
+
+def discipline_from_file_name(file_name):
+    discipline = "Неизвестно"
+    for part in (file_name or "").split("_"):
+        if part.upper() in DISCIPLINES:
+            discipline = part.upper()
+    return discipline
+
+
+def parse_number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = NUMBER_PATTERN.match(value)
+        if match:
+            return float(match.group(1).replace(",", "."))
+    return None
+
+
+class PropertyShredder:
+    """Раскладывает свойства Model Derivative в property_values (EAV).
+
+    Категории и имена свойств хранятся один раз в prop_strings,
+    числовые значения дублируются в value_num для сравнений в SQL.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.strings = dict(conn.execute("SELECT value, id FROM prop_strings"))
+        self.buffer = RowBuffer(conn, "property_values", [
+            "view_id", "object_id", "category_id", "name_id", "value_text", "value_num",
+        ])
+
+    def intern(self, value):
+        string_id = self.strings.get(value)
+        if string_id is None:
+            string_id = self.conn.execute("INSERT INTO prop_strings (value) VALUES (?)", (value,)).lastrowid
+            self.strings[value] = string_id
+        return string_id
+
+    def add(self, view_id, object_id, obj):
+        for category, values in (obj.get("properties") or {}).items():
+            if not isinstance(values, dict):
+                continue
+            category_id = self.intern(category)
+            for name, value in values.items():
+                text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+                self.buffer.add((view_id, object_id, category_id, self.intern(name), text, parse_number(value)))
+
+    def close(self):
+        return self.buffer.close()
+
+
+def blob_compressor():
+    """Функция сжатия блобов: один ZstdCompressor на BlobWriter, а не новый на каждую строку."""
+    if BLOB_CODEC == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress
+    return lambda raw: zlib.compress(raw, 6)
+
+
+def decode_blob(codec, data):
+    """Блоб -> исходный JSON-текст (регистрируется в SQLite как raw_blob(codec, data))."""
+    if data is None:
+        return None
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Блоб сжат zstd — установите пакет zstandard")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    return zlib.decompress(data).decode("utf-8")
+
+
+def register_functions(conn):
+    conn.create_function("raw_blob", 2, decode_blob, deterministic=True)
+
+
+def raw_json_sql(alias):
+    """SQL-выражение raw_json строки: из самой таблицы или из blobs по raw_hash (нужен register_functions)."""
+    return f"coalesce({alias}.raw_json, (SELECT raw_blob(b.codec, b.data) FROM blobs b WHERE b.hash = {alias}.raw_hash))"
+
+
+class BlobWriter:
+    """Кладёт raw_json в blobs (content-addressed) и возвращает хэш для столбца raw_hash.
+
+    Одинаковые объекты разных версий и видов хранятся один раз.
+    """
+
+    def __init__(self, conn):
+        self.buffer = RowBuffer(conn, "blobs", ["hash", "codec", "size", "data"], on_conflict="ON CONFLICT(hash) DO NOTHING")
+        self.seen = set()
+        self.raw_bytes = 0
+        self.compress = blob_compressor()
+
+    def put(self, raw_json):
+        raw = raw_json.encode("utf-8")
+        digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
+        self.raw_bytes += len(raw)
+        if digest not in self.seen:
+            self.seen.add(digest)
+            self.buffer.add((digest, BLOB_CODEC, len(raw), self.compress(raw)))
+        return digest
+
+    def flush(self):
+        self.buffer.flush()
+
+    def close(self):
+        self.buffer.flush()
+        print(
+            f"📦 blobs: {len(self.seen)} уникальных из {self.raw_bytes / 1024 / 1024:.1f} МБ raw_json ({BLOB_CODEC})"
+        )
+
+
+def gc_blobs(conn):
+    """Удаляет блобы, на которые больше не ссылается ни одна строка."""
+    deleted = conn.execute("""
+        DELETE FROM blobs WHERE hash NOT IN (
+            SELECT raw_hash FROM elements WHERE raw_hash IS NOT NULL
+            UNION
+            SELECT raw_hash FROM properties WHERE raw_hash IS NOT NULL
+        )
+    """).rowcount
+    conn.commit()
+    if deleted:
+        print(f"🧹 blobs: удалено {deleted} неиспользуемых")
+
+
+def store_columns(columns, blobs):
+    """Столбцы вставки: последний (raw_json) заменяется на raw_hash, если пишем в blobs."""
+    return columns[:-1] + ["raw_hash"] if blobs else columns
+
+
+def store_row(row, blobs):
+    return (*row[:-1], blobs.put(row[-1])) if blobs else tuple(row)
+
+
+def element_row(view_key, obj):
+    """(view_key, object_id, name, raw_json) узла; raw_json — без вложенного массива objects (у детей свои строки)."""
+    node = {key: value for key, value in obj.items() if key != "objects"}
+    return view_key, obj.get("objectid"), obj.get("name"), json.dumps(node, ensure_ascii=False)
+
+
+def walk_elements(view_key, objects):
+    """Обход дерева metadata: строка element_row для каждого узла, дети раньше родителя — как при потоковом чтении."""
     for obj in objects:
         if isinstance(obj, dict):
-            object_id = obj.get("objectid")
-            name = obj.get("name")
-            raw = json.dumps(obj, ensure_ascii=False)
-            cursor.execute("""
-                INSERT INTO elements (view_id, object_id, name, raw_json)
-                VALUES (?, ?, ?, ?)
-            """, (view_id, object_id, name, raw))
             if "objects" in obj:
-                extract_elements(cursor, view_id, obj["objects"])
+                yield from walk_elements(view_key, obj["objects"])
+            yield element_row(view_key, obj)
+
+
+def object_content_hash(obj):
+    """Хэш имени и свойств объекта без objectid (он меняется от версии к версии) — для сравнения версий."""
+    payload = json.dumps([obj.get("name"), obj.get("properties")], ensure_ascii=False, sort_keys=True)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
 
-def extract_properties(cursor, view_id, collection):
+def property_row(view_key, obj):
+    """(view_key, object_id, external_id, content_hash, raw_json) объекта из коллекции свойств."""
+    return (
+        view_key, obj.get("objectid"), obj.get("externalId"), object_content_hash(obj),
+        json.dumps(obj, ensure_ascii=False),
+    )
+
+
+def walk_collection(view_key, collection):
+    """Список свойств вида: строка property_row для каждого объекта."""
     for obj in collection:
         if isinstance(obj, dict):
-            object_id = obj.get("objectid")
-            raw = json.dumps(obj, ensure_ascii=False)
-            cursor.execute("""
-                INSERT INTO properties (view_id, object_id, raw_json)
-                VALUES (?, ?, ?)
-            """, (view_id, object_id, raw))
+            yield property_row(view_key, obj)
 
 
-def create_and_fill_sqlite(project_path):
-    db_path = os.path.join(project_path, "project_data.sqlite")
-    conn = sqlite3.connect(db_path)
+def iter_elements(meta_path, stream):
+    if use_streaming(meta_path, stream):
+        # Узлы по одному на любой глубине; строки и их порядок — те же, что у walk_elements
+        for view_key, obj in iter_view_objects(meta_path, "objects", children_key="objects"):
+            yield element_row(view_key, obj)
+        return
+    with open(meta_path, "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+    for view_key, entry in metadata.items():
+        objects = entry.get("data", {}).get("data", {}).get("objects", [])
+        yield from walk_elements(view_key, objects)
+
+
+def iter_properties(props_path, stream):
+    if use_streaming(props_path, stream):
+        for view_key, obj in iter_view_objects(props_path, "collection"):
+            yield property_row(view_key, obj)
+        return
+    with open(props_path, "r", encoding="utf-8") as f:
+        properties = json.load(f)
+    for view_key, entry in properties.items():
+        collection = entry.get("data", {}).get("data", {}).get("collection", [])
+        yield from walk_collection(view_key, collection)
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_changed(cursor, path, digest):
+    row = cursor.execute(
+        "SELECT content_hash FROM sync_sources WHERE source = ?", (os.path.basename(path),)
+    ).fetchone()
+    return not row or row[0] != digest
+
+
+def save_source_hash(cursor, path, digest):
+    cursor.execute("""
+        INSERT INTO sync_sources (source, content_hash, synced_at)
+        VALUES (?, ?, datetime('now'))
+        ON CONFLICT(source) DO UPDATE SET
+            content_hash = excluded.content_hash,
+            synced_at = excluded.synced_at
+    """, (os.path.basename(path), digest))
+
+
+def rows_digest(rows):
+    """Хэш строк одного вида (по raw_json, в порядке следования) — тот же, что пишется в sync_watermarks."""
+    digest = hashlib.sha256()
+    for row in rows:
+        digest.update(row[-1].encode("utf-8") + b"\n")
+    return digest.hexdigest()
+
+
+def save_watermarks(cursor, kind, rows):
+    """rows: [(file_name, version_number, view_name, content_hash), ...]"""
+    cursor.executemany("""
+        INSERT INTO sync_watermarks (kind, file_name, version_number, view_name, content_hash, synced_at)
+        VALUES (?, ?, ?, ?, ?, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+        ON CONFLICT(kind, file_name, version_number, view_name) DO UPDATE SET
+            content_hash = excluded.content_hash,
+            synced_at = excluded.synced_at
+    """, [(kind, *row) for row in rows])
+
+
+def view_hashes(rows, views):
+    """Хэш содержимого каждого вида (по raw_json его строк, в порядке файла)."""
+    hashes = {}
+    for view_key, *row in rows:
+        if view_key in views:
+            hashes.setdefault(view_key, hashlib.sha256()).update(row[-1].encode("utf-8") + b"\n")
+    return {view_key: digest.hexdigest() for view_key, digest in hashes.items()}
+
+
+def newer_watermarks(cursor, kind, path):
+    """{(file_name, version_number, view_name): content_hash} видов, записанных в базу позже изменения JSON.
+
+    Такие виды обычно пишет SqliteSink уже после того, как JSON был выгружен, — у базы данные свежее.
+    """
+    # synced_at хранится с миллисекундами — JSON, записанный в ту же секунду после вида, не считается старым
+    mtime = os.path.getmtime(path)
+    file_time = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(mtime)) + f".{int(mtime % 1 * 1000):03d}"
+    return {
+        (row[0], row[1], row[2]): row[3]
+        for row in cursor.execute("""
+            SELECT file_name, version_number, view_name, content_hash
+            FROM sync_watermarks WHERE kind = ? AND synced_at > ?
+        """, (kind, file_time))
+    }
+
+
+def load_view_rows(conn, kind, columns, make_rows, views, incremental, newer=None, shredder=None, blobs=None):
+    """Загружает строки elements/properties.
+
+    База — источник истины: перезаписываются только виды, которые есть в JSON, остальные не трогаются.
+    Вид не перезаписывается, если в базе он новее JSON (newer — см. newer_watermarks) и отличается от него.
+    В режиме incremental перезаливаются только виды, у которых изменился хэш.
+    shredder (PropertyShredder) дополнительно раскладывает свойства в property_values,
+    blobs (BlobWriter) — raw_json уходит в blobs, в таблице остаётся raw_hash.
+    Возвращает множество id перезаписанных видов.
+    """
     cursor = conn.cursor()
+    newer = newer or {}
+    watermarks = {}
+    if incremental:
+        watermarks = {
+            (row[0], row[1], row[2]): row[3]
+            for row in cursor.execute("""
+                SELECT file_name, version_number, view_name, content_hash
+                FROM sync_watermarks WHERE kind = ?
+            """, (kind,))
+        }
+    hashes = view_hashes(make_rows(), views)
+    stale = {
+        view_key for view_key, digest in hashes.items()
+        if views[view_key][1:] in newer and newer[views[view_key][1:]] != digest
+    }
+    changed = {
+        view_key for view_key, digest in hashes.items()
+        if view_key not in stale and (not incremental or watermarks.get(views[view_key][1:]) != digest)
+    }
+    if stale:
+        print(f"⏭️ {kind}: видов в базе новее JSON — {len(stale)}, оставлены как есть")
+    print(f"🔁 {kind}: перезаписывается видов {len(changed)} из {len(hashes)}")
+    if not changed:
+        return set()
+
+    # Строки перезаписываемых видов удаляются одним проходом по каждой таблице
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS reload_views (id INTEGER PRIMARY KEY)")
+    cursor.execute("DELETE FROM reload_views")
+    cursor.executemany("INSERT INTO reload_views (id) VALUES (?)", [(views[view_key][0],) for view_key in changed])
+    for table in VIEW_TABLES[kind]:
+        cursor.execute(f"DELETE FROM {table} WHERE view_id IN (SELECT id FROM reload_views)")
+    if not incremental:
+        # Полная загрузка: вторичные индексы строятся заново после вставки (build_indexes), а не на каждой строке
+        drop_indexes(cursor, VIEW_TABLES[kind])
+    conn.commit()
+
+    hashes = {}
+    buffer = RowBuffer(conn, kind, ["view_id"] + store_columns(columns, blobs))
+    for view_key, *row in make_rows():
+        view = views.get(view_key)
+        if not view or view_key not in changed:
+            continue
+        hashes.setdefault(view_key, hashlib.sha256()).update(row[-1].encode("utf-8") + b"\n")
+        buffer.add((view[0], *store_row(row, blobs)))
+        if shredder:
+            shredder.add(view[0], row[0], json.loads(row[-1]))
+    if blobs:
+        blobs.close()
+    buffer.close()
+    if shredder:
+        shredder.close()
+
+    save_watermarks(cursor, kind, [(*views[view_key][1:], digest.hexdigest()) for view_key, digest in hashes.items()])
+    conn.commit()
+    return {views[view_key][0] for view_key in changed}
+
+
+def drop_indexes(cursor, tables):
+    """Удаляет вторичные индексы (INDEXES) таблиц tables; уникальные индексы остаются — на них upsert."""
+    for statement in INDEXES:
+        name, table = re.match(r"CREATE INDEX IF NOT EXISTS (\S+) ON (\S+)", statement).groups()
+        if table in tables:
+            cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def build_indexes(conn):
+    started = time.perf_counter()
+    for statement in INDEXES:
+        conn.execute(statement)
+    conn.commit()
+    print(f"📊 Индексы построены за {time.perf_counter() - started:.2f} сек")
+
 
-    # Таблицы
+def search_index_missing(conn):
+    """Элементы есть, а поискового индекса (или его версий по видам) нет — нужна полная пересборка."""
+    return conn.execute("SELECT 1 FROM elements LIMIT 1").fetchone() is not None and (
+        conn.execute("SELECT 1 FROM search_index LIMIT 1").fetchone() is None
+        or conn.execute("SELECT 1 FROM search_index_views LIMIT 1").fetchone() is None
+    )
+
+
+# 🔹 Версии строк search_index по видам (хэши из sync_watermarks) — пишутся в той же транзакции, что и строки
+SEARCH_INDEX_VIEWS = """
+    INSERT OR REPLACE INTO search_index_views (view_id, elements_hash, properties_hash)
+    SELECT v.id,
+           (SELECT w.content_hash FROM sync_watermarks w WHERE w.kind = 'elements'
+            AND w.file_name = v.file_name AND w.version_number = v.version_number AND w.view_name = v.view_name),
+           (SELECT w.content_hash FROM sync_watermarks w WHERE w.kind = 'properties'
+            AND w.file_name = v.file_name AND w.version_number = v.version_number AND w.view_name = v.view_name)
+    FROM views v
+"""
+
+
+def build_search_index(conn, view_ids=None):
+    """Полнотекстовый индекс search_index (FTS5) по именам элементов и значениям свойств.
+
+    view_ids — обновляются только строки этих видов; None — полная пересборка.
+    """
+    started = time.perf_counter()
+    conn.create_function("discipline", 1, discipline_from_file_name, deterministic=True)
+    register_functions(conn)
+    if view_ids is None:
+        conn.execute("DELETE FROM search_index")
+        where = ""
+    else:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS search_views (id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM search_views")
+        conn.executemany("INSERT INTO search_views (id) VALUES (?)", [(view_id,) for view_id in view_ids])
+        conn.execute("DELETE FROM search_index WHERE view_id IN (SELECT id FROM search_views)")
+        where = "WHERE e.view_id IN (SELECT id FROM search_views)"
+    conn.execute(f"""
+        INSERT INTO search_index (
+            name, props, file_name, version_number, view_name, discipline, view_id, object_id
+        )
+        SELECT
+            e.name,
+            (
+                SELECT group_concat(t.key || ' ' || t.value, ' ')
+                FROM json_tree({raw_json_sql("p")}, '$.properties') t
+                WHERE t.type NOT IN ('object', 'array')
+            ),
+            v.file_name, v.version_number, v.view_name, discipline(v.file_name),
+            e.view_id, e.object_id
+        FROM elements e
+        JOIN views v ON v.id = e.view_id
+        LEFT JOIN properties p ON p.view_id = e.view_id AND p.object_id = e.object_id
+        {where}
+    """)
+    if view_ids is None:
+        conn.execute("DELETE FROM search_index_views")
+        conn.execute(SEARCH_INDEX_VIEWS)
+        conn.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+    else:
+        conn.execute(SEARCH_INDEX_VIEWS + " WHERE v.id IN (SELECT id FROM search_views)")
+    conn.commit()
+    scope = "все виды" if view_ids is None else f"видов: {len(view_ids)}"
+    print(f"📊 search_index ({scope}) обновлён за {time.perf_counter() - started:.2f} сек")
+
+
+def create_schema(cursor):
+    """Создаёт таблицы проекта (и догоняет старые базы). Возвращает True, если доступен FTS5."""
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS rvt_files (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -56,9 +588,13 @@ def create_and_fill_sqlite(project_path):
             file_name TEXT,
             version_number INTEGER,
             view_name TEXT,
-            guid TEXT
+            guid TEXT,
+            role TEXT
         )
     """)
+    # Базы, созданные до появления столбца role (нужен /api/views-3d)
+    if "role" not in {row[1] for row in cursor.execute("PRAGMA table_info(views)")}:
+        cursor.execute("ALTER TABLE views ADD COLUMN role TEXT")
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS elements (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -78,77 +614,269 @@ def create_and_fill_sqlite(project_path):
             FOREIGN KEY(view_id) REFERENCES views(id)
         )
     """)
+    # Сжатые raw_json, общие для всех версий (elements/properties ссылаются по raw_hash)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS blobs (
+            hash TEXT PRIMARY KEY,
+            codec TEXT,
+            size INTEGER,
+            data BLOB
+        )
+    """)
+    for table, column in (
+        ("elements", "raw_hash"), ("properties", "raw_hash"),
+        ("properties", "external_id"), ("properties", "content_hash"),
+    ):
+        if column not in {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} TEXT")
+    # Нормализованные свойства (EAV): строки категорий/имён интернируются
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS prop_strings (
+            id INTEGER PRIMARY KEY,
+            value TEXT UNIQUE
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS property_values (
+            view_id INTEGER,
+            object_id INTEGER,
+            category_id INTEGER REFERENCES prop_strings(id),
+            name_id INTEGER REFERENCES prop_strings(id),
+            value_text TEXT,
+            value_num REAL,
+            FOREIGN KEY(view_id) REFERENCES views(id)
+        )
+    """)
+    # Полнотекстовый поиск по элементам (имя + значения свойств)
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+                name, props,
+                file_name UNINDEXED, version_number UNINDEXED, view_name UNINDEXED,
+                discipline UNINDEXED, view_id UNINDEXED, object_id UNINDEXED,
+                tokenize = 'unicode61'
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS search_index_views (
+                view_id INTEGER PRIMARY KEY,
+                elements_hash TEXT,
+                properties_hash TEXT
+            )
+        """)
+        has_fts = True
+    except sqlite3.OperationalError:
+        print("⚠️ SQLite собран без FTS5 — поисковый индекс не строится")
+        has_fts = False
+    # Состояние синхронизации: хэши исходных файлов и «водяные знаки» видов
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sync_sources (
+            source TEXT PRIMARY KEY,
+            content_hash TEXT,
+            synced_at TEXT
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sync_watermarks (
+            kind TEXT,
+            file_name TEXT,
+            version_number INTEGER,
+            view_name TEXT,
+            content_hash TEXT,
+            synced_at TEXT,
+            PRIMARY KEY (kind, file_name, version_number, view_name)
+        )
+    """)
+    return has_fts
+
+
+def load_rvt_files(conn, data):
+    """Версии из rvt_files.json -> rvt_files (upsert по file_id + version_number)."""
+    project_id = data.get("project_id")
+    buffer = RowBuffer(conn, "rvt_files", [
+        "project_id", "file_name", "file_id",
+        "version_number", "version_id", "urn",
+        "last_modified_time", "last_modified_user",
+        "published_time", "published_user", "process_state",
+    ], on_conflict="""
+        ON CONFLICT(file_id, version_number) DO UPDATE SET
+            project_id = excluded.project_id,
+            file_name = excluded.file_name,
+            version_id = excluded.version_id,
+            urn = excluded.urn,
+            last_modified_time = excluded.last_modified_time,
+            last_modified_user = excluded.last_modified_user,
+            published_time = excluded.published_time,
+            published_user = excluded.published_user,
+            process_state = excluded.process_state
+    """)
+    for file in data.get("rvt_files", []):
+        file_name = file.get("name")
+        file_id = file.get("id")
+        for version in file.get("versions", []):
+            buffer.add((
+                project_id, file_name, file_id,
+                version.get("version_number"), version.get("version_id"), version.get("urn"),
+                version.get("last_modified_time"), version.get("last_modified_user"),
+                version.get("published_time"), version.get("published_user"), version.get("process_state")
+            ))
+    buffer.close()
+
+
+# 🔹 Вид из guids.json -> строка views (ключ (file_name, version_number, view_name))
+UPSERT_VIEW = """
+    INSERT INTO views (
+        view_key, project_name, file_name,
+        version_number, view_name, guid, role
+    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(file_name, version_number, view_name) DO UPDATE SET
+        view_key = excluded.view_key,
+        project_name = excluded.project_name,
+        guid = excluded.guid,
+        role = excluded.role
+"""
+
+
+def view_row(view):
+    return (
+        f"{view['name']}__v{view['version_number']}", view.get("project_name"), view.get("file_name"),
+        view.get("version_number"), view.get("name"), view.get("guid"), view.get("role")
+    )
+
+
+def has_property_values(cursor):
+    """База уже нормализована (--normalize) — property_values нужно поддерживать и без флага."""
+    return cursor.execute("SELECT 1 FROM property_values LIMIT 1").fetchone() is not None
+
+
+def remove_duplicates(cursor):
+    """Дубли от старой версии скрипта (до уникальных ключей): остаётся последняя строка каждого ключа."""
+    cursor.execute("""
+        DELETE FROM rvt_files
+        WHERE file_id IS NOT NULL AND version_number IS NOT NULL AND id NOT IN (
+            SELECT max(id) FROM rvt_files GROUP BY file_id, version_number
+        )
+    """)
+    duplicates = """
+        SELECT id FROM views
+        WHERE file_name IS NOT NULL AND version_number IS NOT NULL AND view_name IS NOT NULL AND id NOT IN (
+            SELECT max(id) FROM views GROUP BY file_name, version_number, view_name
+        )
+    """
+    for table in ("elements", "properties", "property_values"):
+        cursor.execute(f"DELETE FROM {table} WHERE view_id IN ({duplicates})")
+    cursor.execute(f"DELETE FROM views WHERE id IN ({duplicates})")
+    cursor.execute("DELETE FROM sync_sources")  # Все JSON перечитываются заново
+    try:
+        cursor.execute("DELETE FROM search_index")  # Строки удалённых видов; индекс пересоберётся целиком
+    except sqlite3.OperationalError:
+        pass  # SQLite без FTS5
+
+
+def prepare_tables(conn):
+    """Уникальные ключи для upsert. Данные не удаляются: база — источник истины, виды перезаписываются по одному."""
+    cursor = conn.cursor()
+    try:
+        for statement in UNIQUE_INDEXES:
+            cursor.execute(statement)
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        print("⚠️ В базе есть дубли от прежних загрузок — остаются последние строки")
+        remove_duplicates(cursor)
+        for statement in UNIQUE_INDEXES:
+            cursor.execute(statement)
+    conn.commit()
+
+
+def create_and_fill_sqlite(project_path, stream=None, incremental=False, normalize=False, compact=True):
+    db_path = os.path.join(project_path, "project_data.sqlite")
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # ⚡ Режим массовой загрузки: WAL и без fsync на каждый коммит
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=OFF")
+
+    has_fts = create_schema(cursor)
+    prepare_tables(conn)
+    if not normalize and has_property_values(cursor):
+        # Иначе у перезаписанных видов property_values удаляются и не заполняются заново
+        normalize = True
+        print("ℹ️ В базе есть property_values — изменившиеся виды раскладываются и без --normalize")
+    source_hashes = {}
 
     # rvt_files.json
     rvt_path = os.path.join(project_path, "rvt_files.json")
     if os.path.exists(rvt_path):
+        source_hashes[rvt_path] = file_hash(rvt_path)
+    if rvt_path in source_hashes and (not incremental or source_changed(cursor, rvt_path, source_hashes[rvt_path])):
         with open(rvt_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            project_id = data.get("project_id")
-            for file in data.get("rvt_files", []):
-                file_name = file.get("name")
-                file_id = file.get("id")
-                for version in file.get("versions", []):
-                    cursor.execute("""
-                        INSERT INTO rvt_files (
-                            project_id, file_name, file_id,
-                            version_number, version_id, urn,
-                            last_modified_time, last_modified_user,
-                            published_time, published_user, process_state
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        project_id, file_name, file_id,
-                        version.get("version_number"), version.get("version_id"), version.get("urn"),
-                        version.get("last_modified_time"), version.get("last_modified_user"),
-                        version.get("published_time"), version.get("published_user"), version.get("process_state")
-                    ))
+            load_rvt_files(conn, json.load(f))
 
     # guids.json
-    view_key_to_id = {}
     guids_path = os.path.join(project_path, "guids.json")
     if os.path.exists(guids_path):
+        source_hashes[guids_path] = file_hash(guids_path)
+    guids_changed = guids_path in source_hashes and (
+        not incremental or source_changed(cursor, guids_path, source_hashes[guids_path])
+    )
+    if guids_changed:
         with open(guids_path, "r", encoding="utf-8") as f:
             guids_data = json.load(f)
-            for view in guids_data:
-                view_key = f"{view['name']}__v{view['version_number']}"
-                cursor.execute("""
-                    INSERT INTO views (
-                        view_key, project_name, file_name,
-                        version_number, view_name, guid
-                    ) VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    view_key, view.get("project_name"), view.get("file_name"),
-                    view.get("version_number"), view.get("name"), view.get("guid")
-                ))
-                view_id = cursor.lastrowid
-                view_key_to_id[view_key] = view_id
-
-    # metadata.json
-    meta_path = os.path.join(project_path, "metadata.json")
-    if os.path.exists(meta_path):
-        with open(meta_path, "r", encoding="utf-8") as f:
-            metadata = json.load(f)
-            for view_key, entry in metadata.items():
-                view_id = view_key_to_id.get(view_key)
-                if not view_id:
-                    continue
-                objects = entry.get("data", {}).get("data", {}).get("objects", [])
-                extract_elements(cursor, view_id, objects)
-
-    # properties.json
-    props_path = os.path.join(project_path, "properties.json")
-    if os.path.exists(props_path):
-        with open(props_path, "r", encoding="utf-8") as f:
-            properties = json.load(f)
-            for view_key, entry in properties.items():
-                view_id = view_key_to_id.get(view_key)
-                if not view_id:
-                    continue
-                collection = entry.get("data", {}).get("data", {}).get("collection", [])
-                extract_properties(cursor, view_id, collection)
+            cursor.executemany(UPSERT_VIEW, [view_row(view) for view in guids_data])
+        conn.commit()
 
+    # view_key -> (view_id, file_name, version_number, view_name); при совпадении ключей побеждает последний
+    views = {
+        row[0]: tuple(row[1:])
+        for row in cursor.execute("SELECT view_key, id, file_name, version_number, view_name FROM views ORDER BY id")
+    }
 
+    # metadata.json / properties.json
+    sources = [
+        ("elements", os.path.join(project_path, "metadata.json"), ["object_id", "name", "raw_json"], iter_elements),
+        ("properties", os.path.join(project_path, "properties.json"), PROPERTY_COLUMNS, iter_properties),
+    ]
+    # Свойства перезаливаются целиком при первом запуске с --normalize поверх уже загруженной базы
+    # и если в базе есть строки без хэшей содержимого (загружены до их появления)
+    has_properties = cursor.execute("SELECT 1 FROM properties LIMIT 1").fetchone() is not None
+    renormalize = incremental and has_properties and (
+        (normalize and not has_property_values(cursor))
+        # Старейшая строка без хэша — база загружена до его появления (перезаливка обновляет все строки)
+        or cursor.execute("SELECT content_hash FROM properties ORDER BY rowid LIMIT 1").fetchone()[0] is None
+    )
+    loaded = set()  # id перезаписанных видов
+    for kind, path, columns, iter_rows in sources:
+        if not os.path.exists(path):
+            continue
+        source_hashes[path] = file_hash(path)
+        unchanged = not guids_changed and not source_changed(cursor, path, source_hashes[path])
+        if incremental and unchanged and not (kind == "properties" and renormalize):
+            print(f"⏭️ {os.path.basename(path)} не изменился")
+            continue
+        shredder = PropertyShredder(conn) if normalize and kind == "properties" else None
+        blobs = BlobWriter(conn) if compact else None
+        force = kind == "properties" and renormalize  # Все виды файла, а не только изменившиеся
+        loaded |= load_view_rows(
+            conn, kind, columns, lambda: iter_rows(path, stream), views, incremental and not force,
+            newer_watermarks(cursor, kind, path), shredder, blobs,
+        )
+
+    for path, digest in source_hashes.items():
+        save_source_hash(cursor, path, digest)
     conn.commit()
+
+    # Индексы — после загрузки, затем возвращаем обычный режим синхронизации
+    build_indexes(conn)
+
+    if loaded:
+        gc_blobs(conn)
+    if has_fts and search_index_missing(conn):
+        build_search_index(conn)
+    elif has_fts and loaded:
+        build_search_index(conn, loaded)
+    cursor.execute("PRAGMA synchronous=NORMAL")
+
     conn.close()
     return db_path
 
@@ -171,7 +899,17 @@ def main():
     project_path = os.path.join(hub_path, projects[proj_index])
 
     print(f"📂 Выбран проект: {projects[proj_index]}")
-    db_path = create_and_fill_sqlite(project_path)
+    # --stream — принудительно потоковое чтение metadata.json / properties.json
+    # --incremental — перезаписать только изменившиеся виды (без него — все виды из JSON; остальные в базе сохраняются)
+    # --normalize — дополнительно разложить свойства в property_values (запросы по свойствам в SQL)
+    # --inline-json — хранить raw_json прямо в elements/properties, без сжатых блобов
+    db_path = create_and_fill_sqlite(
+        project_path,
+        stream=True if "--stream" in sys.argv else None,
+        incremental="--incremental" in sys.argv,
+        normalize="--normalize" in sys.argv,
+        compact="--inline-json" not in sys.argv,
+    )
     print(f"✅ База данных сохранена: {db_path}")
 
 if __name__ == "__main__":
@@ -4,6 +4,10 @@ import json
 import sys
 import os
 import base64
+import time
+from urllib.parse import urlencode
+import aps_client
+from aps_client import arg_value, fetch  # Общий клиент: лимиты по семействам API, повторы, статистика
 from get_token import load_token  # Функция для загрузки токена
 
 # ✅ Загружаем access_token
@@ -18,27 +22,63 @@ VERSIONS_ENDPOINT = "https://developer.api.autodesk.com/data/v1/projects/{projec
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 
-
+# 🔹 Постраничное чтение списков Data Management API
+PAGE_LIMIT = 200  # page[limit]: элементов на странице (--page-limit=N)
+PREFETCH_PAGES = 4  # Сколько следующих страниц запрашивать параллельно
 
 # ✅ Кодировка URN в Base64
 def encode_urn(urn):
     return base64.b64encode(urn.encode()).decode().rstrip("=")
 
 
-# ✅ Асинхронный GET-запрос с обработкой 429 (Too Many Requests)
-async def fetch(session, url, headers, description):
-    for attempt in range(1, 6):
-        print(f"🔹 {description} -> {url} (Попытка {attempt})")
-        async with session.get(url, headers=headers) as response:
-            if response.status == 200:
-                return await response.json()
-            elif response.status == 429:
-                print(f"⚠️ Ошибка 429 (Слишком много запросов). Ждём {attempt * 2} сек...")
-                await asyncio.sleep(attempt * 2)
-            else:
-                print(f"❌ Ошибка ({response.status}) при {description}")
+# ✅ Адрес страницы списка: page[number] / page[limit]
+def page_url(url, number, limit):
+    return f"{url}?{urlencode({'page[number]': number, 'page[limit]': limit})}"
+
+
+def next_href(page):
+    next_link = (page.get("links") or {}).get("next")
+    if isinstance(next_link, dict):
+        next_link = next_link.get("href")
+    return next_link or None
+
+
+# ✅ Все страницы списка: {"data": [...], "included": [...]} или None, если не удалось получить хотя бы одну
+async def fetch_all_pages(session, url, headers, description, page_limit=None):
+    page_limit = page_limit or PAGE_LIMIT
+    page = await fetch(session, page_url(url, 0, page_limit), headers, description)
+    if not page:
+        return None
+
+    data = list(page.get("data", []))
+    included = list(page.get("included", []))
+    href = next_href(page)
+    number = 1
+    while href:
+        if "page%5Bnumber%5D" in href or "page[number]" in href:
+            # Страницы по номеру — следующие PREFETCH_PAGES запрашиваем разом
+            batch = await asyncio.gather(*(
+                fetch(session, page_url(url, number + i, page_limit), headers, f"{description} (стр. {number + i + 1})")
+                for i in range(PREFETCH_PAGES)
+            ))
+            number += PREFETCH_PAGES
+        else:
+            # Курсорная пагинация — только по ссылке next
+            batch = [await fetch(session, href, headers, f"{description} (далее)")]
+
+        href = None
+        for page in batch:
+            if not page:
+                # Повторы уже исчерпаны в aps_client; неполный список хуже, чем никакой
+                print(f"❌ {description}: страница не получена, список не сохраняется")
                 return None
-    return None
+            data.extend(page.get("data", []))
+            included.extend(page.get("included", []))
+            href = next_href(page)
+            if not href:
+                break
+
+    return {"data": data, "included": included}
 
 
 # ✅ Получение списка хабов
@@ -51,8 +91,8 @@ async def get_hubs(session):
 
 # ✅ Получение списка проектов в хабе
 async def get_projects(session, hub_id):
-    projects_data = await fetch(session, PROJECTS_ENDPOINT.format(hub_id=hub_id),
-                                {"Authorization": f"Bearer {access_token}"}, "получение проектов")
+    projects_data = await fetch_all_pages(session, PROJECTS_ENDPOINT.format(hub_id=hub_id),
+                                          {"Authorization": f"Bearer {access_token}"}, "получение проектов")
     if projects_data:
         return [{"id": proj["id"], "name": proj["attributes"]["name"].replace(" ", "_")} for proj in
                 projects_data.get("data", [])]
@@ -71,8 +111,8 @@ async def find_bim_models_folder(session, project_id, top_folders):
     for folder in top_folders:
         if "project files" in folder["attributes"]["displayName"].lower():
             project_files_folder_id = folder["id"]
-            contents = await fetch(session, FOLDER_CONTENTS_ENDPOINT.format(project_id=project_id, folder_id=project_files_folder_id),
-                                   {"Authorization": f"Bearer {access_token}"}, "получение подпапок Project Files")
+            contents = await fetch_all_pages(session, FOLDER_CONTENTS_ENDPOINT.format(project_id=project_id, folder_id=project_files_folder_id),
+                                             {"Authorization": f"Bearer {access_token}"}, "получение подпапок Project Files")
             if contents:
                 for subfolder in contents.get("data", []):
                     if "bim models" in subfolder["attributes"]["displayName"].lower():
@@ -82,16 +122,37 @@ async def find_bim_models_folder(session, project_id, top_folders):
 
 # ✅ Рекурсивный поиск `.rvt` файлов внутри BIM Models
 async def get_all_rvt_files(session, project_id, folder_id):
+    """Файлы .rvt папки и всех подпапок; None, если хотя бы один список папки получен не полностью."""
     rvt_files = []
-    contents = await fetch(session, FOLDER_CONTENTS_ENDPOINT.format(project_id=project_id, folder_id=folder_id),
-                           {"Authorization": f"Bearer {access_token}"}, "поиск файлов Revit")
+    contents = await fetch_all_pages(session, FOLDER_CONTENTS_ENDPOINT.format(project_id=project_id, folder_id=folder_id),
+                                     {"Authorization": f"Bearer {access_token}"}, "поиск файлов Revit")
+    if contents is None:
+        return None
 
     if contents:
+        # Tip-версии элементов приходят в included — по ним узнаём номер последней версии без отдельного запроса
+        tip_numbers = {
+            v["id"]: v.get("attributes", {}).get("versionNumber")
+            for v in contents.get("included", []) if v.get("type") == "versions"
+        }
+        subfolders = []
         for item in contents.get("data", []):
             if item["type"] == "folders":
-                rvt_files.extend(await get_all_rvt_files(session, project_id, item["id"]))
+                subfolders.append(item["id"])
             elif item["type"] == "items" and item["attributes"]["displayName"].endswith(".rvt"):
-                rvt_files.append({"name": item["attributes"]["displayName"], "id": item["id"]})
+                tip_id = item.get("relationships", {}).get("tip", {}).get("data", {}).get("id")
+                rvt_files.append({
+                    "name": item["attributes"]["displayName"],
+                    "id": item["id"],
+                    "last_modified_time": item["attributes"].get("lastModifiedTime"),
+                    "tip_version_number": tip_numbers.get(tip_id),
+                })
+
+        # Подпапки обходим параллельно (общий лимит задаёт aps_client)
+        for found in await asyncio.gather(*(get_all_rvt_files(session, project_id, sub_id) for sub_id in subfolders)):
+            if found is None:
+                return None
+            rvt_files.extend(found)
 
     return rvt_files
 
@@ -99,7 +160,7 @@ async def get_all_rvt_files(session, project_id, folder_id):
 # ✅ Получение всех версий файла
 async def get_file_versions(session, project_id, file_id):
     url = VERSIONS_ENDPOINT.format(project_id=project_id, file_id=file_id)
-    response = await fetch(session, url, {"Authorization": f"Bearer {access_token}"}, f"получение версий файла {file_id}")
+    response = await fetch_all_pages(session, url, {"Authorization": f"Bearer {access_token}"}, f"получение версий файла {file_id}")
 
     versions = []
     if response:
@@ -122,8 +183,37 @@ async def get_file_versions(session, project_id, file_id):
     return []
 
 
+# ✅ Предыдущий rvt_files.json (для режима --delta)
+def previous_document(json_file_path):
+    try:
+        with open(json_file_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_previous_files(json_file_path):
+    """file_id -> запись файла из прошлого обхода."""
+    document = previous_document(json_file_path) or {}
+    return {f["id"]: f for f in document.get("rvt_files", []) if "id" in f}
+
+
+def file_unchanged(rvt_file, old):
+    """Файл не менялся, если совпадают lastModifiedTime элемента и номер последней версии."""
+    if not old or not old.get("versions") or not rvt_file.get("last_modified_time"):
+        return False
+    if old.get("last_modified_time") != rvt_file["last_modified_time"]:
+        return False
+    tip = rvt_file.get("tip_version_number")
+    if tip is not None:
+        numbers = [v.get("version_number") for v in old["versions"] if isinstance(v.get("version_number"), int)]
+        if not numbers or max(numbers) != tip:
+            return False
+    return True
+
+
 # ✅ Основная функция обработки проекта
-async def process_project(session, hub, project):
+async def process_project(session, hub, project, delta=False):
     print(f"📂 Обрабатываем проект: {project['name']} (из хаба {hub['name']})")
 
     # Создаём папку для проекта
@@ -140,22 +230,87 @@ async def process_project(session, hub, project):
 
     # Получаем файлы Revit
     rvt_files = await get_all_rvt_files(session, project["id"], bim_models_folder_id)
+    if rvt_files is None:
+        print(f"❌ Список файлов {project['name']} получен не полностью — rvt_files.json не перезаписывается")
+        return
     print(f"📄 Найдено {len(rvt_files)} файлов Revit в {project['name']}.")
 
-    # Получаем версии файлов
-    for rvt_file in rvt_files:
-        rvt_file["versions"] = await get_file_versions(session, project["id"], rvt_file["id"])
-
-    # Сохраняем rvt_files.json
     json_file_path = os.path.join(project_path, "rvt_files.json")
+    previous = load_previous_files(json_file_path) if delta else {}
+
+    # Получаем версии файлов (в режиме --delta — только изменившихся)
+    to_fetch = [f for f in rvt_files if not file_unchanged(f, previous.get(f["id"]))]
+    fetch_ids = {f["id"] for f in to_fetch}
+    for rvt_file in rvt_files:
+        if rvt_file["id"] not in fetch_ids:
+            rvt_file["versions"] = previous[rvt_file["id"]]["versions"]
+    if delta:
+        print(f"🔁 Изменились {len(to_fetch)} из {len(rvt_files)} файлов, остальные берём из {json_file_path}")
+
+    all_versions = await asyncio.gather(*(get_file_versions(session, project["id"], f["id"]) for f in to_fetch))
+    for rvt_file, versions in zip(to_fetch, all_versions):
+        old = previous.get(rvt_file["id"])
+        if not versions and old and old.get("versions"):
+            # Запрос не удался — оставляем прежние версии и старую метку, чтобы повторить в следующий раз
+            print(f"⚠️ Версии {rvt_file['name']} не получены, оставляем прежние")
+            rvt_file["versions"] = old["versions"]
+            rvt_file["last_modified_time"] = old.get("last_modified_time")
+            continue
+        rvt_file["versions"] = versions
+
+    # Сохраняем rvt_files.json (в режиме --delta — только если что-то поменялось)
+    data = {"project_id": project["id"], "rvt_files": rvt_files}
+    if delta and previous and previous_document(json_file_path) == data:
+        print(f"✅ Без изменений: {json_file_path}")
+        return
     with open(json_file_path, "w", encoding="utf-8") as f:
-        json.dump({"project_id": project["id"], "rvt_files": rvt_files}, f, indent=4, ensure_ascii=False)
+        json.dump(data, f, indent=4, ensure_ascii=False)
     print(f"✅ Данные сохранены в {json_file_path}")
 
 
+# ✅ Неинтерактивный обход: все проекты всех (или выбранного) хабов за один запуск
+async def crawl_all(session, hub_name=None, delta=False):
+    hubs = await get_hubs(session)
+    if hub_name:
+        hubs = [hub for hub in hubs if hub["name"] == hub_name]
+        if not hubs:
+            print(f"❌ Хаб {hub_name} не найден")
+            return
+
+    for hub in hubs:
+        projects = await get_projects(session, hub["id"])
+        print(f"🌐 Хаб {hub['name']}: {len(projects)} проектов")
+        results = await asyncio.gather(
+            *(process_project(session, hub, project, delta) for project in projects),
+            return_exceptions=True,
+        )
+        for project, result in zip(projects, results):
+            if isinstance(result, Exception):
+                print(f"❌ Ошибка в проекте {project['name']}: {result}")
+
+
 # ✅ Основная программа
 async def main():
-    async with aiohttp.ClientSession() as session:
+    global PAGE_LIMIT
+    concurrency = int(arg_value("concurrency", aps_client.MAX_CONCURRENCY))
+    aps_client.configure(concurrency=concurrency)
+    PAGE_LIMIT = int(arg_value("page-limit", PAGE_LIMIT))
+    delta = "--delta" in sys.argv  # Запрашивать версии только у изменившихся файлов
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        if "--crawl-all" in sys.argv:
+            started = time.perf_counter()
+            await crawl_all(session, arg_value("hub"), delta)
+            elapsed = time.perf_counter() - started
+            requests_done = aps_client.stats["requests"]
+            print(
+                f"🏁 Обход завершён за {elapsed:.1f} сек: {requests_done} запросов "
+                f"({requests_done / max(elapsed, 1e-9):.1f} запр/сек), параллельность: {concurrency}"
+            )
+            aps_client.print_report()
+            return
+
         hubs = await get_hubs(session)
         while True:
             print("🔹 Доступные хабы:")
@@ -170,7 +325,7 @@ async def main():
                 print(f"{i}. {project['name']}")
 
             project_index = int(input("Выберите номер проекта: ")) - 1
-            await process_project(session, hubs[hub_index], projects[project_index])
+            await process_project(session, hubs[hub_index], projects[project_index], delta)
 
             cont = input("Хотите обработать другой проект? (да/нет): ").strip().lower()
             if cont != "да":
@@ -181,4 +336,4 @@ if __name__ == "__main__":
     if sys.platform == "win32":
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())  # 🔹 Исправление ошибки в Windows
     
-    asyncio.run(main())  # 🔹 Запуск основного кода
\ No newline at end of file
+    asyncio.run(main())  # 🔹 Запуск основного кода
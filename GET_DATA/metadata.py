@@ -1,118 +1,213 @@
 import os
 import json
 import asyncio
+import time
 import aiohttp
-import requests
-from get_token import get_access_token
+from concurrent.futures import ThreadPoolExecutor
+import aps_client
+from aps_client import fetch, print_report, request
+from get_token import token_provider
+from sqlite_sink import SqliteSink
 import sys
 
 if sys.platform.startswith('win') and sys.version_info < (3, 10):
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-def get_all_view_guids(access_token, urn, save_path, project_name, file_name, version_number):
-    url = f"https://developer.api.autodesk.com/modelderivative/v2/designdata/{urn}/metadata"
-    headers = {"Authorization": f"Bearer {access_token}"}
+METADATA_ENDPOINT = "https://developer.api.autodesk.com/modelderivative/v2/designdata/{urn}/metadata"
+
+# 🔹 Один общий лимит параллельных запросов на весь проект (все файлы, версии и виды)
+MAX_CONCURRENCY = 8
+
+# 🔹 202 «ещё обрабатывается»: повторяем запрос с нарастающей паузой, пока не истечёт POLL_TIMEOUT
+POLL_INITIAL = 5  # секунд
+POLL_MAX = 60
+POLL_TIMEOUT = 15 * 60
+FORCEGET = "--forceget" in sys.argv  # Сразу запрашивать свойства с forceget=true
+
+# 🔹 Данные видов пишутся сразу в project_data.sqlite; metadata.json / properties.json — только с --json
+EXPORT_JSON = "--json" in sys.argv
+NORMALIZE = "--normalize" in sys.argv  # Раскладывать свойства в property_values (как json_to_sqlite --normalize)
+
+
+async def auth_headers():
+    """Заголовки с действующим токеном — на каждый запрос: загрузка с ожиданием 202 идёт дольше жизни токена."""
+    return {"Authorization": f"Bearer {await token_provider.get_async()}"}
+
+async def get_all_view_guids(session, urn, project_name, file_name, version_number):
     print(f"🔍 Получаем список видов для URN: {urn} ...")
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        raw_views = response.json().get("data", {}).get("metadata", [])
-        views = []
-        for view in raw_views:
-            view.update({
-                "project_name": project_name,
-                "file_name": file_name,
-                "version_number": version_number
-            })
-            views.append(view)
-
-        path = os.path.join(save_path, "guids.json")
-        existing = []
-        if os.path.exists(path):
-            with open(path, "r", encoding="utf-8") as f:
-                existing = json.load(f)
-
-        existing_guids = {v["guid"] for v in existing}
-        for view in views:
-            if view["guid"] not in existing_guids:
-                existing.append(view)
-
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(existing, f, indent=4, ensure_ascii=False)
-
-        print(f"✅ Виды сохранены ({len(views)} новых)")
-        return {v["guid"]: v["name"] for v in views}
-    else:
-        print(f"❌ Ошибка получения видов: {response.status_code}")
-        return {}
-
-async def get_metadata_for_view(session, access_token, urn, guid, semaphore):
-    url = f"https://developer.api.autodesk.com/modelderivative/v2/designdata/{urn}/metadata/{guid}"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    async with semaphore:
-        async with session.get(url, headers=headers) as resp:
-            return await resp.json() if resp.status == 200 else None
-
-async def get_properties_for_view(session, access_token, urn, guid, semaphore):
-    url = f"https://developer.api.autodesk.com/modelderivative/v2/designdata/{urn}/metadata/{guid}/properties"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    async with semaphore:
-        async with session.get(url, headers=headers) as resp:
-            return await resp.json() if resp.status == 200 else None
+    response = await fetch(session, METADATA_ENDPOINT.format(urn=urn), await auth_headers(), f"список видов {file_name} v{version_number}")
+    if not response:
+        print(f"❌ Ошибка получения видов: {file_name} v{version_number}")
+        return []
+
+    views = []
+    for view in response.get("data", {}).get("metadata", []):
+        view.update({
+            "project_name": project_name,
+            "file_name": file_name,
+            "version_number": version_number
+        })
+        views.append(view)
+    return views
+
+def save_view_guids(save_path, views):
+    path = os.path.join(save_path, "guids.json")
+    existing = []
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            existing = json.load(f)
+
+    existing_guids = {v["guid"] for v in existing}
+    added = 0
+    for view in views:
+        if view["guid"] not in existing_guids:
+            existing.append(view)
+            existing_guids.add(view["guid"])
+            added += 1
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(existing, f, indent=4, ensure_ascii=False)
+
+    print(f"✅ Виды сохранены ({added} новых)")
+
+async def fetch_when_ready(session, url, description):
+    """GET к Model Derivative с ожиданием 202. Возвращает (status, data); status 202 — не дождались.
+
+    Пока запрос ждёт следующей попытки, остальные виды продолжают загружаться.
+    """
+    delay = POLL_INITIAL
+    deadline = time.monotonic() + POLL_TIMEOUT
+    while True:
+        status, data = await request(session, "GET", url, await auth_headers(), description)
+        if status != 202:
+            return status, data
+        if time.monotonic() + delay > deadline:
+            print(f"⌛ {description}: сервер всё ещё готовит данные, отложено")
+            return status, None
+        print(f"⏳ {description}: 202, данные готовятся, повтор через {delay} сек")
+        await asyncio.sleep(delay)
+        delay = min(POLL_MAX, delay * 2)
+
+async def get_metadata_for_view(session, urn, guid):
+    url = f"{METADATA_ENDPOINT.format(urn=urn)}/{guid}"
+    return await fetch_when_ready(session, url, f"дерево объектов вида {guid}")
+
+async def get_properties_for_view(session, urn, guid):
+    url = f"{METADATA_ENDPOINT.format(urn=urn)}/{guid}/properties"
+    if FORCEGET:
+        return await fetch_when_ready(session, f"{url}?forceget=true", f"свойства вида {guid} (forceget)")
+    status, data = await fetch_when_ready(session, url, f"свойства вида {guid}")
+    if status == 413:
+        # Слишком большой набор свойств — API отдаёт его только с forceget=true
+        status, data = await fetch_when_ready(session, f"{url}?forceget=true", f"свойства вида {guid} (forceget)")
+    return status, data
 
 def make_unique_view_key(view_name, version_number):
     return f"{view_name}__v{version_number}"
 
-async def process_all_views(access_token, urn, project_path, guid_name_map, version_number, project_name, file_name):
-    metadata_result = {}
-    properties_result = {}
-    semaphore = asyncio.Semaphore(5)
-
-    async with aiohttp.ClientSession() as session:
-        metadata_list = await asyncio.gather(*[
-            get_metadata_for_view(session, access_token, urn, guid, semaphore)
-            for guid in guid_name_map
-        ])
-        for guid, metadata in zip(guid_name_map, metadata_list):
-            if metadata:
-                view_name = guid_name_map[guid]
-                key = make_unique_view_key(view_name, version_number)
-                metadata_result[key] = {
-                    "project_name": project_name,
-                    "file_name": file_name,
-                    "version_number": version_number,
-                    "view_name": view_name,
-                    "data": metadata
-                }
-
-        properties_list = await asyncio.gather(*[
-            get_properties_for_view(session, access_token, urn, guid, semaphore)
-            for guid in guid_name_map
-        ])
-        for guid, props in zip(guid_name_map, properties_list):
-            if props:
-                view_name = guid_name_map[guid]
-                key = make_unique_view_key(view_name, version_number)
-                properties_result[key] = {
-                    "project_name": project_name,
-                    "file_name": file_name,
-                    "version_number": version_number,
-                    "view_name": view_name,
-                    "data": props
-                }
-
-    def merge_json(path, new_data):
-        if os.path.exists(path):
-            with open(path, "r", encoding="utf-8") as f:
-                old = json.load(f)
-        else:
-            old = {}
-        old.update(new_data)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(old, f, indent=4, ensure_ascii=False)
-
-    merge_json(os.path.join(project_path, "metadata.json"), metadata_result)
-    merge_json(os.path.join(project_path, "properties.json"), properties_result)
-    print("🎉 metadata и properties обновлены!")
+def view_state(status, data):
+    if data:
+        return "ok"
+    return "ожидание" if status == 202 else f"ошибка {status}"
+
+async def write_to_db(results, method, *args):
+    """Запись в SQLite — в отдельном потоке (один писатель), чтобы не тормозить сетевой конвейер."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(results["db_writer"], method, *args)
+
+async def process_view(session, urn, view, results):
+    """Дерево объектов и свойства одного вида запрашиваются одновременно."""
+    (metadata_status, metadata), (props_status, props) = await asyncio.gather(
+        get_metadata_for_view(session, urn, view["guid"]),
+        get_properties_for_view(session, urn, view["guid"]),
+    )
+    for kind, data in (("elements", metadata), ("properties", props)):
+        if data:
+            await write_to_db(results, results["sink"].write_view, view, kind, data)
+
+    key = make_unique_view_key(view["name"], view["version_number"])
+    for kind, data in (("metadata", metadata), ("properties", props)):
+        if data and EXPORT_JSON:
+            results[kind][key] = {
+                "project_name": view["project_name"],
+                "file_name": view["file_name"],
+                "version_number": view["version_number"],
+                "view_name": view["name"],
+                "data": data
+            }
+
+    # Отчёт о готовности вида
+    states = (view_state(metadata_status, metadata), view_state(props_status, props))
+    results["done"] += 1
+    label = f"{view['name']} ({view['file_name']} v{view['version_number']})"
+    if states == ("ok", "ok"):
+        print(f"✅ [{results['done']}/{len(results['guids'])}] {label}")
+    else:
+        results["incomplete"].append({"view": label, "guid": view["guid"], "metadata": states[0], "properties": states[1]})
+        print(f"⚠️ [{results['done']}/{len(results['guids'])}] {label}: metadata {states[0]}, properties {states[1]}")
+
+async def process_version(session, urn, project_name, file_name, version_number, results):
+    print(f"🔹 Обработка файла: {file_name}, версия: {version_number}")
+    views = await get_all_view_guids(session, urn, project_name, file_name, version_number)
+    if not views:
+        print(f"⚠️ Нет видов для версии {version_number} ({file_name})")
+        return
+    results["guids"].extend(views)
+    await write_to_db(results, results["sink"].write_views, views)
+    # Виды версии сразу уходят в общий конвейер, не дожидаясь других версий
+    await asyncio.gather(*(process_view(session, urn, view, results) for view in views))
+
+def merge_json(path, new_data):
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            old = json.load(f)
+    else:
+        old = {}
+    old.update(new_data)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(old, f, indent=4, ensure_ascii=False)
+
+async def process_project(project_path, project_name, rvt_data):
+    """Единый конвейер по всем (файл, версия, вид) проекта: одна сессия, один общий лимит запросов."""
+    results = {"guids": [], "metadata": {}, "properties": {}, "done": 0, "incomplete": []}
+    tasks = []
+    started = time.perf_counter()
+
+    results["sink"] = SqliteSink(project_path, normalize=NORMALIZE)
+    results["db_writer"] = ThreadPoolExecutor(max_workers=1)
+    await write_to_db(results, results["sink"].write_rvt_files, rvt_data)
+
+    aps_client.configure(concurrency=MAX_CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENCY)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        # Обходим все файлы и все версии
+        for file in rvt_data.get("rvt_files", []):
+            file_name = file.get("name")
+            for version in file.get("versions", []):
+                urn = version.get("urn", "").strip()
+                if not urn or urn == "Нет данных":
+                    continue
+                tasks.append(process_version(
+                    session, urn, project_name, file_name, version.get("version_number"), results
+                ))
+        await asyncio.gather(*tasks)
+
+    await write_to_db(results, results["sink"].close)
+    results["db_writer"].shutdown()
+
+    # Файлы пишем один раз в конце, а не после каждой версии
+    save_view_guids(project_path, results["guids"])
+    if EXPORT_JSON:
+        merge_json(os.path.join(project_path, "metadata.json"), results["metadata"])
+        merge_json(os.path.join(project_path, "properties.json"), results["properties"])
+    print(
+        f"🎉 metadata и properties обновлены: {len(tasks)} версий, {len(results['guids'])} видов "
+        f"за {time.perf_counter() - started:.1f} сек"
+    )
+    if results["incomplete"]:
+        print(f"⚠️ Неполные виды ({len(results['incomplete'])}) — повторите запуск позже (или с --forceget):")
+        for item in results["incomplete"]:
+            print(f"   {item['view']} [{item['guid']}]: metadata {item['metadata']}, properties {item['properties']}")
 
 async def main():
     base_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "BIMW_-_WXG_Group"))
@@ -133,26 +228,13 @@ async def main():
     with open(rvt_file_path, "r", encoding="utf-8") as f:
         rvt_data = json.load(f)
 
-    access_token = get_access_token()
-
-    # Обходим все файлы и все версии
-    for file in rvt_data.get("rvt_files", []):
-        file_name = file.get("name")
-        for version in file.get("versions", []):
-            urn = version.get("urn", "").strip()
-            version_number = version.get("version_number")
-
-            if not urn:
-                continue
-
-            print(f"🔹 Обработка файла: {file_name}, версия: {version_number}")
+    if not await token_provider.get_async():  # Сохранённый токен, если он ещё действует
+        print("❌ Не удалось получить токен Autodesk")
+        return
 
-            guid_map = get_all_view_guids(access_token, urn, project_path, project_name, file_name, version_number)
-            if not guid_map:
-                print(f"⚠️ Нет видов для версии {version_number}")
-                continue
+    await process_project(project_path, project_name, rvt_data)
 
-            await process_all_views(access_token, urn, project_path, guid_map, version_number, project_name, file_name)
+    print_report()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,126 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from json_to_sqlite import (
+    PROPERTY_COLUMNS, UPSERT_VIEW, VIEW_TABLES, BlobWriter, PropertyShredder,
+    build_indexes, build_search_index, create_schema, gc_blobs, has_property_values, load_rvt_files,
+    prepare_tables, rows_digest, save_watermarks, search_index_missing, store_columns, store_row, view_row,
+    walk_collection, walk_elements,
+)
+
+# 🔹 Столбцы строк вида (без view_id) — как в json_to_sqlite.create_and_fill_sqlite
+VIEW_COLUMNS = {
+    "elements": ["object_id", "name", "raw_json"],
+    "properties": PROPERTY_COLUMNS,
+}
+
+
+class SqliteSink:
+    """Пишет данные видов прямо в project_data.sqlite по мере загрузки.
+
+    Заменяет связку metadata.json / properties.json + json_to_sqlite.py: каждый вид
+    перезаписывается одной транзакцией, а неизменившиеся (по хэшу в sync_watermarks) пропускаются.
+    Схема и хэши те же, что у json_to_sqlite, поэтому оба пути можно смешивать.
+    """
+
+    def __init__(self, project_path, normalize=False, compact=True):
+        self.db_path = os.path.join(project_path, "project_data.sqlite")
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.has_fts = create_schema(self.conn.cursor())
+        prepare_tables(self.conn)
+        # Нормализованная база: property_values перезаписываемых видов заполняются и без --normalize
+        normalize = normalize or has_property_values(self.conn.cursor())
+        self.shredder = PropertyShredder(self.conn) if normalize else None
+        self.blobs = BlobWriter(self.conn) if compact else None
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.stats = {"written": 0, "unchanged": 0, "rows": 0}
+        self.written_views = set()  # id перезаписанных видов — для search_index
+
+    def write_rvt_files(self, data):
+        with self.lock:
+            load_rvt_files(self.conn, data)
+
+    def write_views(self, views):
+        """Виды из ответа /metadata (как в guids.json)."""
+        with self.lock:
+            self.conn.executemany(UPSERT_VIEW, [view_row(view) for view in views])
+            self.conn.commit()
+
+    def write_view(self, view, kind, response):
+        """kind: elements | properties; response — JSON ответа Model Derivative для вида."""
+        view_key = f"{view['name']}__v{view['version_number']}"
+        payload = response.get("data", {})
+        if kind == "elements":
+            rows = list(walk_elements(view_key, payload.get("objects", [])))
+        else:
+            rows = list(walk_collection(view_key, payload.get("collection", [])))
+        digest = rows_digest(rows)
+        key = (view.get("file_name"), view.get("version_number"), view.get("name"))
+
+        with self.lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute(UPSERT_VIEW, view_row(view))
+                view_id = cursor.execute(
+                    "SELECT id FROM views WHERE file_name = ? AND version_number = ? AND view_name = ?", key
+                ).fetchone()[0]
+                watermark = cursor.execute("""
+                    SELECT content_hash FROM sync_watermarks
+                    WHERE kind = ? AND file_name = ? AND version_number = ? AND view_name = ?
+                """, (kind, *key)).fetchone()
+                if watermark and watermark[0] == digest:
+                    self.conn.commit()
+                    self.stats["unchanged"] += 1
+                    return 0
+
+                # Блобы записываются до замены строк вида, чтобы ссылки raw_hash всегда были валидны
+                stored = [(view_id, *store_row(row[1:], self.blobs)) for row in rows]
+                if self.blobs:
+                    self.blobs.flush()
+                for table in VIEW_TABLES[kind]:
+                    cursor.execute(f"DELETE FROM {table} WHERE view_id = ?", (view_id,))
+                columns = ["view_id"] + store_columns(VIEW_COLUMNS[kind], self.blobs)
+                cursor.executemany(
+                    f"INSERT INTO {kind} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    stored,
+                )
+                if self.shredder and kind == "properties":
+                    for row in rows:
+                        self.shredder.add(view_id, row[1], json.loads(row[-1]))
+                    self.shredder.buffer.flush()
+                save_watermarks(cursor, kind, [(*key, digest)])
+                self.conn.commit()
+                self.written_views.add(view_id)
+            except sqlite3.Error:
+                self.conn.rollback()
+                raise
+
+        self.stats["written"] += 1
+        self.stats["rows"] += len(rows)
+        return len(rows)
+
+    def close(self):
+        """Индексы и поисковый индекс — один раз в конце загрузки."""
+        with self.lock:
+            if self.shredder:
+                self.shredder.close()
+            if self.blobs:
+                self.blobs.close()
+                if self.stats["written"]:
+                    gc_blobs(self.conn)
+            build_indexes(self.conn)
+            if self.has_fts and search_index_missing(self.conn):
+                build_search_index(self.conn)
+            elif self.has_fts and self.written_views:
+                build_search_index(self.conn, self.written_views)
+            self.conn.close()
+        print(
+            f"📊 SQLite: записано видов {self.stats['written']} ({self.stats['rows']} строк), "
+            f"без изменений {self.stats['unchanged']}, {time.perf_counter() - self.started:.1f} сек -> {self.db_path}"
+        )
@@ -3,6 +3,8 @@ import aiohttp
 import json
 import os
 import sys
+import aps_client
+from aps_client import fetch
 from get_token import load_token  # Загрузка токена из файла
 
 # 🔹 Загружаем access_token
@@ -13,25 +15,12 @@ DERIVATIVE_MANIFEST_ENDPOINT = "https://developer.api.autodesk.com/modelderivati
 
 # 🔹 Параметры для ускоренной обработки
 BATCH_SIZE = 5  # Количество запросов в одной пачке
-semaphore = asyncio.Semaphore(10)  # Ограничение параллельных запросов
+aps_client.configure(concurrency=10)  # Ограничение параллельных запросов
 
 # 🔹 Основная папка с хабами и проектами
 BASE_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 
 
-async def fetch(session, url, headers, description):
-    """Асинхронный GET-запрос с обработкой ошибок 429."""
-    async with semaphore:
-        for attempt in range(1, 6):
-            async with session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    return await response.json()
-                elif response.status == 429:
-                    await asyncio.sleep(attempt * 2)
-                else:
-                    return None
-        return None
-
 async def check_translation_status(session, access_token, urns):
     """Проверяет статус перевода нескольких версий параллельно."""
     tasks = [
@@ -138,6 +127,8 @@ async def main():
         else:
             print(f"⚠️ Обработка проекта {project_name} завершена без данных.")
 
+        aps_client.print_report()
+
 if __name__ == "__main__":
     if sys.platform == "win32":
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())  # 🔹 Исправление ошибки в Windows
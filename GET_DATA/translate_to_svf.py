@@ -2,45 +2,73 @@ import asyncio
 import aiohttp
 import json
 import os
+import sqlite3
 import sys
 import time
+import aps_client
+from aps_client import arg_value, fetch, print_report  # 🔹 Общий клиент с лимитами и повторами, флаги --name=value
 from get_token import load_token  # 🔹 Загружаем токен без нового запроса
 # === Глобальные переменные ===
 BASE_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "BIMW_-_WXG_Group"))
   # Папка хаба
 VERSION_STATUS_FILE = "versions_status.json"  # Файл со статусами версий
 
+# 🔹 Статусы манифеста, после которых перевод уже не меняется — такие URN повторно не запрашиваем
+TERMINAL_STATUSES = {"success", "failed", "timeout"}
+MAX_CONCURRENCY = 16  # Общий лимит запросов на весь хаб (--concurrency=N)
+
 # === Загружаем токен ===
 access_token = load_token()
 
 # === API эндпоинты ===
 DERIVATIVE_MANIFEST_ENDPOINT = "https://developer.api.autodesk.com/modelderivative/v2/designdata/{urn}/manifest"
 
-# === Асинхронный GET-запрос ===
-async def fetch(session, url, headers, description):
-    """Асинхронный GET-запрос с обработкой ошибок 429."""
-    for attempt in range(1, 6):
-        async with session.get(url, headers=headers) as response:
-            if response.status == 200:
-                return await response.json()
-            elif response.status == 429:
-                print(f"⚠️ Ошибка 429 ({description}), ждём {attempt * 2} сек...")
-                await asyncio.sleep(attempt * 2)
-            else:
-                print(f"❌ Ошибка {response.status} ({description})")
-                return None
-    return None
-
 # === Проверка статуса перевода ===
 async def check_translation_status(session, urn):
-    """Проверяет статус перевода версии."""
+    """Проверяет статус перевода версии. Возвращает (status, progress)."""
     url = DERIVATIVE_MANIFEST_ENDPOINT.format(urn=urn)
     headers = {"Authorization": f"Bearer {access_token}"}
 
     response = await fetch(session, url, headers, f"Статус перевода URN {urn}")
     if response:
-        return response.get("status", "not available")
-    return "not available"
+        return response.get("status", "not available"), response.get("progress")
+    return "not available", None
+
+# === Кэш статусов: таблица translation_status в project_data.sqlite (её же читает дашборд) ===
+def open_status_db(project_path):
+    conn = sqlite3.connect(os.path.join(project_path, "project_data.sqlite"))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS translation_status (
+            urn TEXT PRIMARY KEY,
+            file_name TEXT,
+            version_number INTEGER,
+            status TEXT,
+            progress TEXT,
+            checked_at TEXT
+        )
+    """)
+    return conn
+
+def cached_statuses(conn):
+    """{urn: (status, progress)} — только завершённые переводы."""
+    rows = conn.execute("SELECT urn, status, progress FROM translation_status").fetchall()
+    return {urn: (status, progress) for urn, status, progress in rows if status in TERMINAL_STATUSES}
+
+def save_statuses(conn, rows):
+    """rows: (urn, file_name, version_number, status, progress) — одной транзакцией."""
+    checked_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+    conn.executemany("""
+        INSERT INTO translation_status (urn, file_name, version_number, status, progress, checked_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(urn) DO UPDATE SET
+            file_name = excluded.file_name,
+            version_number = excluded.version_number,
+            status = excluded.status,
+            progress = excluded.progress,
+            checked_at = excluded.checked_at
+    """, [(*row, checked_at) for row in rows])
+    conn.commit()
 
 # === Выбор проекта ===
 def select_project():
@@ -61,21 +89,25 @@ def select_project():
     return None
 
 # === Обработка проекта ===
-async def process_project(project_name):
-    """Обрабатывает проект, проверяя статусы всех версий."""
+async def process_project(session, project_name, refresh=False):
+    """Проверяет статусы всех версий проекта параллельно; завершённые берутся из кэша (кроме refresh)."""
     project_path = os.path.join(BASE_FOLDER, project_name)
     json_path = os.path.join(project_path, "rvt_files.json")
 
     if not os.path.exists(json_path):
         print(f"⚠️ В проекте {project_name} нет файла rvt_files.json. Пропускаем...")
-        return
+        return None
 
     with open(json_path, "r", encoding="utf-8") as f:
         project_data = json.load(f)
 
-    versions_data = {}  # Сюда запишем статусы версий
+    conn = open_status_db(project_path)
+    try:
+        cache = {} if refresh else cached_statuses(conn)
+        versions_data = {}  # Сюда запишем статусы версий
+        to_check = []  # (file_name, version_number, urn) — незавершённые и новые
+        cached = 0
 
-    async with aiohttp.ClientSession() as session:
         for rvt_file in project_data.get("rvt_files", []):
             file_name = rvt_file["name"]
             versions_data[file_name] = []
@@ -87,18 +119,28 @@ async def process_project(project_name):
                 if urn == "Нет данных":
                     print(f"⚠️ Версия {version_number} ({file_name}) - URN отсутствует, перевод невозможен.")
                     versions_data[file_name].append({"version": version_number, "status": "Перевод невозможен", "urn": "Нет данных"})
-                    continue
-
-                status = await check_translation_status(session, urn)
-                print(f"✅ Версия {version_number} ({file_name}) - {status}")
-                versions_data[file_name].append({"version": version_number, "status": status, "urn": urn})
-
-    # === Сохранение в JSON ===
-    save_versions_status(project_name, versions_data)
+                elif urn in cache:
+                    cached += 1
+                    versions_data[file_name].append({"version": version_number, "status": cache[urn][0], "urn": urn})
+                else:
+                    to_check.append((file_name, version_number, urn))
+
+        statuses = await asyncio.gather(*(check_translation_status(session, urn) for _, _, urn in to_check))
+        rows = []
+        for (file_name, version_number, urn), (status, progress) in zip(to_check, statuses):
+            print(f"✅ Версия {version_number} ({file_name}) - {status}" + (f" ({progress})" if progress else ""))
+            versions_data[file_name].append({"version": version_number, "status": status, "urn": urn})
+            rows.append((urn, file_name, version_number, status, progress))
+        save_statuses(conn, rows)
+    finally:
+        conn.close()
+
+    print(f"📊 {project_name}: проверено {len(to_check)}, из кэша {cached}")
+    return versions_data
 
 # === Сохранение в JSON ===
-def save_versions_status(project_name, versions_data):
-    """Сохраняет данные о версиях в versions_status.json"""
+def save_versions_status(results):
+    """Сохраняет данные о версиях ({проект: статусы}) в versions_status.json"""
     if os.path.exists(VERSION_STATUS_FILE):
         with open(VERSION_STATUS_FILE, "r", encoding="utf-8") as f:
             all_data = json.load(f)
@@ -108,7 +150,7 @@ def save_versions_status(project_name, versions_data):
     if "BIMW_-_WXG_Group" not in all_data:
         all_data["BIMW_-_WXG_Group"] = {}
 
-    all_data["BIMW_-_WXG_Group"][project_name] = versions_data
+    all_data["BIMW_-_WXG_Group"].update(results)
 
     with open(VERSION_STATUS_FILE, "w", encoding="utf-8") as f:
         json.dump(all_data, f, indent=4, ensure_ascii=False)
@@ -117,12 +159,35 @@ def save_versions_status(project_name, versions_data):
 
 # === Основная функция ===
 async def main():
-    project_name = select_project()
-    if not project_name:
-        return
-
-    print(f"📂 Обрабатываем проект: {project_name} (из хаба BIMW_-_WXG_Group)")
-    await process_project(project_name)
+    refresh = "--refresh" in sys.argv  # Перепроверить и завершённые переводы
+    if "--all" in sys.argv:
+        # Весь хаб без вопросов: все проекты параллельно под общим лимитом запросов
+        projects = [f for f in os.listdir(BASE_FOLDER) if os.path.isdir(os.path.join(BASE_FOLDER, f))]
+    else:
+        project_name = select_project()
+        if not project_name:
+            return
+        projects = [project_name]
+        print(f"📂 Обрабатываем проект: {project_name} (из хаба BIMW_-_WXG_Group)")
+
+    concurrency = int(arg_value("concurrency", MAX_CONCURRENCY))
+    aps_client.configure(concurrency=concurrency)
+    started = time.perf_counter()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        results = await asyncio.gather(
+            *(process_project(session, project, refresh) for project in projects), return_exceptions=True
+        )
+
+    statuses = {}
+    for project, result in zip(projects, results):
+        if isinstance(result, Exception):
+            print(f"❌ Ошибка в проекте {project}: {result}")
+        elif result is not None:
+            statuses[project] = result
+    save_versions_status(statuses)
+    print(f"🏁 Проверено проектов: {len(statuses)} за {time.perf_counter() - started:.1f} сек")
+    print_report()
 
 
 if __name__ == "__main__":
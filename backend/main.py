@@ -5,16 +5,26 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from GET_DATA.get_token import get_access_token
+from GET_DATA.get_token import token_provider
+from GET_DATA.geo import itm_to_wgs84
+from GET_DATA.json_to_sqlite import discipline_from_file_name, register_functions
+from backend.utils.db_pool import (
+    connect, register_schema, register_connection_hook, ensure_schema, pool_stats, close_all,
+)
+from backend.utils.hub_catalog import HubCatalog
+from backend.utils.chat_engine import chat_engine
+from backend.utils.diff import diff_cache, diff_page
+from backend.utils import queries
 
 
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from collections import defaultdict
 import os
+import json
 import sqlite3
-from pyproj import Transformer
-from math import isnan, isinf
-from fastapi import Path, Body
+import threading
+from fastapi import Path, Body, Query
+from typing import Optional
 from pydantic import BaseModel, field_validator, EmailStr
 from pydantic import field_validator
 
@@ -27,8 +37,6 @@ from dotenv import load_dotenv
 
 import pandas as pd
 
-# # Импорт функций генерации и обучения
-# from backend.utils.generate_dataset import run_dataset_update
 
 
 
@@ -44,9 +52,6 @@ app.add_middleware(
 # 📁 Путь к хабу
 HUB_PATH = r"C:\WXG\Projects\WIP_V7\BIMW_-_WXG_Group"
 
-# 🌍 Трансформация координат
-transformer = Transformer.from_crs("EPSG:2039", "EPSG:4326", always_xy=True)
-
 # Загружаем переменные окружения
 load_dotenv()
 
@@ -73,64 +78,102 @@ class Designer(BaseModel):
 
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-DATASET_PATH = os.path.join(BASE_DIR, "data", "dataset.csv")
 HUB_FOLDER = os.path.join(BASE_DIR, "..", "BIMW_-_WXG_Group")
+CATALOG_PATH = os.path.join(BASE_DIR, "data", "hub_catalog.sqlite")
 
-@app.get("/api/token")
-def get_token():
-    token = get_access_token()
-    return {"access_token": token}
+# 🔹 Сводный каталог хаба (rvt_files / views / координаты всех проектов в одной базе)
+hub_catalog = HubCatalog(HUB_PATH, CATALOG_PATH)
+
+# 🔹 Схема, которая создаётся один раз на каждую базу проекта (а не в каждом запросе)
+register_schema(*queries.PROJECT_SCHEMA)
+register_connection_hook(register_functions)  # raw_blob() для raw_json, сжатых в blobs
 
-# 🔹 Эндпоинт: координаты проектов
-@app.get("/api/coordinates")
-def get_coordinates():
-    all_data = []
 
+@app.on_event("startup")
+def init_project_databases():
+    """Однократно готовит схему во всех базах проектов хаба."""
+    if not os.path.isdir(HUB_PATH):
+        return
     for project_name in os.listdir(HUB_PATH):
-        project_path = os.path.join(HUB_PATH, project_name)
-        db_path = os.path.join(project_path, "project_data.sqlite")
+        db_path = os.path.join(HUB_PATH, project_name, "project_data.sqlite")
         if not os.path.exists(db_path):
             continue
-
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT project_name, north_south, east_west, elevation, angle_to_true_north
-                FROM project_coordinates
-            """)
-            rows = cursor.fetchall()
-
-            for row in rows:
-                try:
-                    ns = float(str(row[1]).replace(",", "."))
-                    ew = float(str(row[2]).replace(",", "."))
-                    if ns > 1_000_000:
-                        ns = ns / 100
-                    if ew > 1_000_000:
-                        ew = ew / 100
-                    lon, lat = transformer.transform(ew, ns)
-
-                    if any([isnan(lat), isinf(lat), isnan(lon), isinf(lon)]):
-                        continue
-
-                    all_data.append({
-                        "project": row[0],
-                        "latitude": lat,
-                        "longitude": lon,
-                        "elevation": row[3],
-                        "angle": row[4],
-                    })
+            ensure_schema(db_path)
+        except Exception as e:
+            print(f"❌ Ошибка подготовки схемы в {project_name}: {e}")
 
-                except Exception:
-                    continue
-            conn.close()
+    hub_catalog.refresh(force=True)
+    hub_catalog.start()
 
-        except Exception:
-            continue
 
+@app.on_event("startup")
+def warm_token_cache():
+    """Токен запрашивается заранее в фоне, чтобы первый /api/token не ждал сервер авторизации."""
+    threading.Thread(target=token_provider.get, daemon=True).start()
+
+
+@app.on_event("shutdown")
+def close_project_databases():
+    hub_catalog.close()
+    close_all()
+
+
+# 🔹 Эндпоинт: метрики пула соединений (попадания/промахи/ожидание)
+@app.get("/api/db-stats")
+def get_db_stats():
+    stats = pool_stats()
+    stats["diff_cache"] = {"hits": diff_cache.hits, "misses": diff_cache.misses}
+    stats["token"] = dict(token_provider.stats)
+    return stats
+
+@app.get("/api/token")
+async def get_token():
+    token = await token_provider.get_async()
+    if not token:
+        raise HTTPException(status_code=503, detail="Не удалось получить токен Autodesk")
+    return {"access_token": token, "expires_in": token_provider.expires_in()}
+
+# 🔹 Кэш координат в WGS84: пересчитывается только при изменении каталога хаба
+_coordinates_cache = {"version": None, "data": []}
+_coordinates_lock = threading.Lock()
+
+
+def build_coordinates():
+    rows = hub_catalog.query(queries.SELECT_CATALOG_COORDINATES)
+
+    # Для баз, записанных до появления latitude/longitude, — один пакетный пересчёт
+    points = [(row[5], row[6]) for row in rows]
+    missing = [i for i, point in enumerate(points) if None in point]
+    computed = itm_to_wgs84([rows[i][1] for i in missing], [rows[i][2] for i in missing])
+    for i, point in zip(missing, computed):
+        points[i] = point
+
+    all_data = []
+    for row, point in zip(rows, points):
+        if not point:
+            continue
+        all_data.append({
+            "project": row[0],
+            "latitude": point[0],
+            "longitude": point[1],
+            "elevation": row[3],
+            "angle": row[4],
+        })
     return all_data
 
+
+# 🔹 Эндпоинт: координаты проектов
+@app.get("/api/coordinates")
+def get_coordinates():
+    if _coordinates_cache["version"] != hub_catalog.version:
+        with _coordinates_lock:
+            version = hub_catalog.version
+            if _coordinates_cache["version"] != version:
+                _coordinates_cache["data"] = build_coordinates()
+                _coordinates_cache["version"] = version
+    return _coordinates_cache["data"]
+
 # 🔹 Эндпоинт: получить проектировщиков проекта
 @app.get("/api/designers")
 def get_designers(project: str):
@@ -138,31 +181,9 @@ def get_designers(project: str):
     if not os.path.exists(db_path):
         raise HTTPException(status_code=404, detail="База данных не найдена")
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS project_designers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            project_name TEXT,
-            discipline TEXT,
-            first_name TEXT,
-            last_name TEXT,
-            company TEXT,
-            email TEXT,
-            phone TEXT,
-            position TEXT
-        )
-    """)
-    conn.commit()
-
-    cursor.execute("""
-        SELECT id, discipline, first_name, last_name, company, email, phone, position
-
-        FROM project_designers
-        WHERE project_name = ?
-    """, (project,))
-    rows = cursor.fetchall()
-    conn.close()
+    ensure_schema(db_path)
+    with connect(db_path) as conn:
+        rows = conn.execute(queries.SELECT_DESIGNERS, (project,)).fetchall()
 
     return [
     {
@@ -185,38 +206,18 @@ def add_designer(designer: Designer):
     if not os.path.exists(db_path):
         raise HTTPException(status_code=404, detail="База данных не найдена")
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS project_designers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            project_name TEXT,
-            discipline TEXT,
-            first_name TEXT,
-            last_name TEXT,
-            company TEXT,
-            email TEXT,
-            phone TEXT,
-            position TEXT
-        )
-    """)
-    cursor.execute("""
-        INSERT INTO project_designers (
-            project_name, discipline, first_name, last_name,
-            company, email, phone, position
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        designer.project_name,
-        designer.discipline,
-        designer.first_name,
-        designer.last_name,
-        designer.company,
-        designer.email,
-        designer.phone,
-        designer.position
-    ))
-    conn.commit()
-    conn.close()
+    with connect(db_path, readonly=False) as conn:
+        conn.execute(queries.INSERT_DESIGNER, (
+            designer.project_name,
+            designer.discipline,
+            designer.first_name,
+            designer.last_name,
+            designer.company,
+            designer.email,
+            designer.phone,
+            designer.position
+        ))
+        conn.commit()
     return {"status": "✅ Участник добавлен"}
 
 
@@ -230,28 +231,18 @@ def update_designer(
     if not os.path.exists(db_path):
         raise HTTPException(status_code=404, detail="База данных не найдена")
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    # Обновляем данные, исключив проверку project_name в WHERE
-    cursor.execute("""
-        UPDATE project_designers SET
-            discipline = ?, first_name = ?, last_name = ?,
-            company = ?, email = ?, phone = ?, position = ?
-        WHERE id = ?
-    """, (
-        updated_data.discipline,
-        updated_data.first_name,
-        updated_data.last_name,
-        updated_data.company,
-        updated_data.email,
-        updated_data.phone,
-        updated_data.position,
-        id
-    ))
-
-    conn.commit()
-    conn.close()
+    with connect(db_path, readonly=False) as conn:
+        conn.execute(queries.UPDATE_DESIGNER, (
+            updated_data.discipline,
+            updated_data.first_name,
+            updated_data.last_name,
+            updated_data.company,
+            updated_data.email,
+            updated_data.phone,
+            updated_data.position,
+            id
+        ))
+        conn.commit()
     return {"status": "✅ Проектировщик обновлён"}
 
 @app.delete("/api/designers/{project}/{id}")
@@ -260,102 +251,57 @@ def delete_designer(project: str, id: int):
     if not os.path.exists(db_path):
         raise HTTPException(status_code=404, detail="База данных не найдена")
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("""
-        DELETE FROM project_designers
-        WHERE id = ? AND project_name = ?
-    """, (id, project))
-    conn.commit()
-    conn.close()
+    with connect(db_path, readonly=False) as conn:
+        conn.execute(queries.DELETE_DESIGNER, (id, project))
+        conn.commit()
 
     return {"status": f"🗑 Проектировщик с ID {id} удалён из проекта {project}"}
 
 @app.get("/api/projects-table")
 def get_projects_table():
-    results = []
-    for project_name in os.listdir(HUB_PATH):
-        project_path = os.path.join(HUB_PATH, project_name)
-        db_path = os.path.join(project_path, "project_data.sqlite")
-        if not os.path.exists(db_path):
-            continue
-
-        try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-
-            cursor.execute("""
-                SELECT file_name, version_number, last_modified_time,
-                       last_modified_user, published_time, published_user, process_state
-                FROM rvt_files
-            """)
-            rows = cursor.fetchall()
-
-            for row in rows:
-                results.append({
-                    "project": project_name,
-                    "file_name": row[0],
-                    "version_number": row[1],
-                    "last_modified_time": row[2],
-                    "last_modified_user": row[3],
-                    "published_time": row[4],
-                    "published_user": row[5],
-                    "process_state": row[6]
-                })
-        except Exception as e:
-            print(f"❌ Ошибка в {project_name}: {e}")
-        finally:
-            conn.close()
+    rows = hub_catalog.query(queries.SELECT_CATALOG_RVT_FILES)
 
-    return results
+    return [
+        {
+            "project": row[0],
+            "file_name": row[1],
+            "version_number": row[2],
+            "last_modified_time": row[3],
+            "last_modified_user": row[4],
+            "published_time": row[5],
+            "published_user": row[6],
+            "process_state": row[7],
+            "translation_status": row[8],
+            "translation_checked_at": row[9]
+        }
+        for row in rows
+    ]
 
 
 @app.get("/api/views-table")
 def get_views_table():
-    from collections import defaultdict
+    rows = hub_catalog.query(queries.SELECT_CATALOG_VIEWS)
+
+    structure = defaultdict(lambda: defaultdict(lambda: defaultdict(lambda: defaultdict(list))))
+    for project_name, file_name, version, view_name, guid in rows:
+        discipline = discipline_from_file_name(file_name)
+        structure[project_name][discipline][file_name][version].append({
+            "view_name": view_name,
+            "guid": guid
+        })
 
     result = []
-    for project_name in os.listdir(HUB_PATH):
-        project_path = os.path.join(HUB_PATH, project_name)
-        db_path = os.path.join(project_path, "project_data.sqlite")
-        if not os.path.exists(db_path):
-            continue
-
-        try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT project_name, file_name, version_number, view_name, guid
-                FROM views
-            """)
-            rows = cursor.fetchall()
-            conn.close()
-
-            structure = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-            for row in rows:
-                project, file_name, version, view_name, guid = row
-                discipline = "Неизвестно"
-                for part in file_name.split("_"):
-                    if part.upper() in ["AR", "ST", "MEP", "EL", "HVAC", "SAN", "COORD"]:
-                        discipline = part.upper()
-                structure[discipline][file_name][version].append({
-                    "view_name": view_name,
-                    "guid": guid
-                })
-
-            for discipline, files in structure.items():
-                for file_name, versions in files.items():
-                    for version, views in versions.items():
-                        result.append({
-                            "project": project_name,
-                            "discipline": discipline,
-                            "file_name": file_name,
-                            "version_number": version,
-                            "views": views
-                        })
-
-        except Exception as e:
-            print(f"❌ Ошибка в {project_name}: {e}")
+    for project_name, disciplines in structure.items():
+        for discipline, files in disciplines.items():
+            for file_name, versions in files.items():
+                for version, views in versions.items():
+                    result.append({
+                        "project": project_name,
+                        "discipline": discipline,
+                        "file_name": file_name,
+                        "version_number": version,
+                        "views": views
+                    })
 
     return result
 
@@ -373,11 +319,8 @@ def get_files_by_project(project: str):
     if not os.path.exists(db_path):
         raise HTTPException(status_code=404, detail="База данных не найдена")
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT file_name FROM views")
-    files = [row[0] for row in cursor.fetchall()]
-    conn.close()
+    with connect(db_path) as conn:
+        files = [row[0] for row in conn.execute(queries.SELECT_FILES)]
     return files
 
 @app.get("/api/views-3d")
@@ -386,175 +329,253 @@ def get_views_3d(project: str, file_name: str):
     if not os.path.exists(db_path):
         raise HTTPException(status_code=404, detail="База данных не найдена")
     
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT view_name, version_number, guid FROM views
-        WHERE file_name = ? AND role = '3d'
-    """, (file_name,))
-    views = [{"view_name": v[0], "version_number": v[1], "guid": v[2]} for v in cursor.fetchall()]
-    conn.close()
+    with connect(db_path) as conn:
+        rows = conn.execute(queries.SELECT_VIEWS_3D, (file_name,)).fetchall()
+    views = [{"view_name": v[0], "version_number": v[1], "guid": v[2]} for v in rows]
     return views
 
+ELEMENTS_PAGE_SIZE = 1000   # Строк за один запрос к базе при потоковой выдаче
+ELEMENTS_MAX_LIMIT = 10000
+
+
+def parse_json(raw):
+    try:
+        return json.loads(raw) if raw else {}
+    except ValueError:
+        return {}
+
+
+def project_properties(props, fields):
+    """Оставляет в properties только поля из fields ("Имя" или "Категория/Имя")."""
+    projected = {}
+    for category, values in props.get("properties", {}).items():
+        if not isinstance(values, dict):
+            continue
+        for name, value in values.items():
+            if name in fields or f"{category}/{name}" in fields:
+                projected.setdefault(category, {})[name] = value
+    return {**{k: v for k, v in props.items() if k != "properties"}, "properties": projected}
+
+
+def iter_view_elements(db_path, view_id, after, limit, fields):
+    """Элементы вида по возрастанию object_id; соединение берётся из пула на каждую страницу."""
+    sql = queries.SELECT_VIEW_PROPERTIES_PAGE if fields else queries.SELECT_VIEW_ELEMENTS_PAGE
+    remaining = limit
+    while remaining is None or remaining > 0:
+        page_size = ELEMENTS_PAGE_SIZE if remaining is None else min(ELEMENTS_PAGE_SIZE, remaining)
+        with connect(db_path) as conn:
+            rows = conn.execute(sql, (view_id, after, page_size)).fetchall()
+
+        for obj_id, name, el_raw, prop_raw in rows:
+            props = parse_json(prop_raw)
+            if fields:
+                yield {"object_id": obj_id, "name": name, "properties": project_properties(props, fields)}
+            else:
+                yield {"object_id": obj_id, "name": name, "element_data": parse_json(el_raw), "properties": props}
+
+        if len(rows) < page_size:
+            return
+        after = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+
+
 @app.get("/api/elements-by-view")
-def get_elements_by_view(project: str, file_name: str, version: int, view_name: str):
+def get_elements_by_view(
+    project: str,
+    file_name: str,
+    version: int,
+    view_name: str,
+    after: int = -1,
+    limit: Optional[int] = Query(None, ge=1, le=ELEMENTS_MAX_LIMIT),
+    fields: Optional[str] = None,
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+):
+    """
+    after — курсор (object_id последнего полученного элемента), limit — размер страницы,
+    fields — список свойств через запятую, format=ndjson — потоковая выдача построчно.
+    Без limit и format возвращается весь вид списком (как раньше).
+    """
     db_path = os.path.join(HUB_PATH, project, "project_data.sqlite")
     if not os.path.exists(db_path):
         raise HTTPException(status_code=404, detail="База данных не найдена")
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT v.id
-        FROM views v
-        WHERE v.project_name = ? AND v.file_name = ? AND v.version_number = ? AND v.view_name = ?
-    """, (project, file_name, version, view_name))
-    row = cursor.fetchone()
-    if not row:
-        conn.close()
-        return []
-
-    view_id = row[0]
-
-    cursor.execute("""
-        SELECT e.object_id, e.name, e.raw_json, p.raw_json
-        FROM elements e
-        LEFT JOIN properties p
-        ON e.view_id = p.view_id AND e.object_id = p.object_id
-        WHERE e.view_id = ?
-    """, (view_id,))
-    elements = []
-    for obj_id, name, el_raw, prop_raw in cursor.fetchall():
-        try:
-            el_json = json.loads(el_raw) if el_raw else {}
-        except:
-            el_json = {}
+    with connect(db_path) as conn:
+        row = conn.execute(queries.SELECT_VIEW_ID, (project, file_name, version, view_name)).fetchone()
+    view_id = row[0] if row else None
+    field_set = {f.strip() for f in fields.split(",") if f.strip()} if fields else None
+
+    def elements():
+        if view_id is None:
+            return iter(())
+        return iter_view_elements(db_path, view_id, after, limit, field_set)
+
+    if response_format == "ndjson":
+        lines = (json.dumps(item, ensure_ascii=False) + "\n" for item in elements())
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+
+    items = list(elements())
+    if limit is None:
+        return items
+    return {
+        "items": items,
+        "next_after": items[-1]["object_id"] if len(items) == limit else None,
+    }
+
+# 🔹 Эндпоинт: элементы по значению свойства (нужна база, собранная с --normalize)
+@app.get("/api/elements-by-property")
+def get_elements_by_property(
+    project: str,
+    property: str,
+    value: Optional[str] = None,
+    min_value: Optional[float] = None,
+    max_value: Optional[float] = None,
+    limit: int = Query(100, ge=1, le=ELEMENTS_MAX_LIMIT),
+):
+    db_path = os.path.join(HUB_PATH, project, "project_data.sqlite")
+    if not os.path.exists(db_path):
+        raise HTTPException(status_code=404, detail="База данных не найдена")
+    if value is None and min_value is None and max_value is None:
+        raise HTTPException(status_code=400, detail="Укажите value или min_value/max_value")
+
+    with connect(db_path) as conn:
+        # Таблицы нормализованных свойств есть в любой базе (create_schema) — смотрим, заполнены ли они
         try:
-            prop_json = json.loads(prop_raw) if prop_raw else {}
-        except:
-            prop_json = {}
-
-        elements.append({
-            "object_id": obj_id,
-            "name": name,
-            "element_data": el_json,
-            "properties": prop_json
-        })
+            normalized = conn.execute(queries.HAS_PROPERTY_VALUES).fetchone() is not None
+        except sqlite3.OperationalError:
+            normalized = False
+        if not normalized:
+            raise HTTPException(status_code=404, detail="Свойства не нормализованы (json_to_sqlite.py --normalize)")
+        row = conn.execute(queries.SELECT_PROPERTY_NAME_ID, (property,)).fetchone()
+        if not row:
+            return []
+
+        if value is not None:
+            rows = conn.execute(queries.SELECT_BY_PROPERTY_TEXT, (row[0], value, limit)).fetchall()
+        else:
+            low = min_value if min_value is not None else float("-inf")
+            high = max_value if max_value is not None else float("inf")
+            rows = conn.execute(queries.SELECT_BY_PROPERTY_RANGE, (row[0], low, high, limit)).fetchall()
+
+    return [
+        {
+            "file_name": r[0],
+            "version_number": r[1],
+            "view_name": r[2],
+            "object_id": r[3],
+            "name": r[4],
+            "category": r[5],
+            "value": r[6],
+        }
+        for r in rows
+    ]
+
+SEARCH_MAX_LIMIT = 200
+
+
+def fts_query(text):
+    """Пользовательская строка -> запрос FTS5: каждое слово в кавычках, последнее — по префиксу."""
+    terms = [t.replace('"', '""') for t in text.split()]
+    if not terms:
+        return None
+    return " ".join(f'"{t}"' for t in terms[:-1]) + (" " if len(terms) > 1 else "") + f'"{terms[-1]}"*'
+
+
+# 🔹 Эндпоинт: полнотекстовый поиск элементов по всему хабу (имена и значения свойств)
+@app.get("/api/search")
+def search_elements(
+    q: str,
+    project: Optional[str] = None,
+    file_name: Optional[str] = None,
+    version: Optional[int] = None,
+    discipline: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=SEARCH_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+):
+    match = fts_query(q)
+    if not match:
+        return {"items": [], "next_offset": None}
+    if not hub_catalog.has_search:
+        raise HTTPException(status_code=503, detail="Поиск недоступен: SQLite без FTS5")
+
+    rows = hub_catalog.query(queries.SEARCH_CATALOG, (
+        match,
+        project, project,
+        file_name, file_name,
+        version, version,
+        discipline, discipline,
+        limit, offset,
+    ))
+
+    items = [
+        {
+            "project": r[0],
+            "file_name": r[1],
+            "version_number": r[2],
+            "view_name": r[3],
+            "discipline": r[4],
+            "object_id": r[5],
+            "name": r[6],
+            "snippet": r[7],
+        }
+        for r in rows
+    ]
+    return {"items": items, "next_offset": offset + limit if len(items) == limit else None}
+
+DIFF_MAX_LIMIT = 1000
+
+
+# 🔹 Эндпоинт: что изменилось в виде между двумя версиями файла
+@app.get("/api/diff")
+def diff_versions(
+    project: str,
+    file_name: str,
+    view_name: str,
+    from_version: int,
+    to_version: int,
+    change: Optional[str] = Query(None, pattern="^(added|removed|modified)$"),
+    limit: int = Query(100, ge=1, le=DIFF_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    details: bool = True,
+):
+    """
+    Элементы сопоставляются по external_id (UniqueId Revit), изменения — по хэшу имени и свойств.
+    change — только один тип изменений, details — построчные изменения свойств у modified.
+    """
+    db_path = os.path.join(HUB_PATH, project, "project_data.sqlite")
+    if not os.path.exists(db_path):
+        raise HTTPException(status_code=404, detail="База данных не найдена")
+
+    view_ids = []
+    with connect(db_path) as conn:
+        for version in (from_version, to_version):
+            row = conn.execute(queries.SELECT_VIEW_ID, (project, file_name, version, view_name)).fetchone()
+            if not row:
+                raise HTTPException(status_code=404, detail=f"Вид не найден в версии {version}")
+            view_ids.append(row[0])
 
-    conn.close()
-    return elements
+    try:
+        return diff_page(db_path, view_ids[0], view_ids[1], change, offset, limit, details)
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
+# 🔹 Эндпоинт: чат-ассистент — ответы заранее посчитаны по набору данных (без чтения файлов)
 @app.post("/api/chat")
 async def chat_assistant(request: Request):
     body = await request.json()
-    question = body.get("question", "").lower().strip()
+    question = body.get("question", "")
 
-    if not os.path.exists(DATASET_PATH):
+    if not chat_engine.ready:
         return {"answer": "🤖 Ассистент временно недоступен, так как база данных AI не загружена."}
+    return {"answer": chat_engine.answer(question)}
 
 
-# @app.post("/api/chat")
-# async def chat_assistant(request: Request):
-#     body = await request.json()
-#     question = body.get("question", "").lower().strip()
-
-#     if not os.path.exists(DATASET_PATH):
-#         return {"answer": "⚠️ dataset.csv не найден."}
-
-#     try:
-#         df = pd.read_csv(DATASET_PATH)
-#     except Exception as e:
-#         return {"answer": f"⚠️ Ошибка при чтении данных: {e}"}
-
-#     # Все проекты и таблицы
-#     all_projects = set(os.listdir(HUB_FOLDER))
-#     dataset_projects = set(df["project"].dropna().unique()) if "project" in df.columns else set()
-#     table_names = df["table_name"].unique() if "table_name" in df.columns else []
-#     missing_projects = all_projects - dataset_projects
-
-#     # -------------------------------- КООРДИНАТЫ --------------------------------
-#     coord_keywords = ["coord", "north", "east", "lat", "lon", "n/s", "e/w", "геолокац", "местоположен", "где", "координат", "расположен", "находится"]
-#     if any(k in question for k in coord_keywords):
-#         # ищем любые столбцы с координатами
-#         coord_cols = [col for col in df.columns if any(kw in col.lower() for kw in coord_keywords)]
-
-#         if not coord_cols:
-#             return {"answer": "⚠️ Не найдены поля, похожие на координаты."}
-
-#         sample = df[["project"] + coord_cols].dropna().head(5).to_dict(orient="records")
-#         rows = [
-#             f"📍 {r['project']}: " + ", ".join([f"{k}={r[k]}" for k in coord_cols if pd.notna(r.get(k))])
-#             for r in sample
-#         ]
-#         return {"answer": f"🗺️ Примеры координат:\n" + "\n".join(rows)}
-
-#     # -------------------------------- НАЗВАНИЯ ПРОЕКТОВ --------------------------------
-#     if any(k in question for k in ["назв", "перечисли", "список", "что у меня", "покажи проекты", "какие проекты"]):
-#         if dataset_projects:
-#             return {"answer": f"📁 Проекты: {', '.join(sorted(dataset_projects))}"}
-#         return {"answer": "⚠️ В dataset нет проектов."}
-
-#     # -------------------------------- СКОЛЬКО ПРОЕКТОВ --------------------------------
-#     if "сколько" in question and "проект" in question:
-#         return {"answer": f"📊 Всего проектов в dataset: {len(dataset_projects)}"}
-
-#     # -------------------------------- ПРОПУЩЕННЫЕ ПРОЕКТЫ --------------------------------
-#     if any(k in question for k in ["почему", "не загружен", "отсутств", "пропущен", "только"]):
-#         if missing_projects:
-#             return {"answer": f"⚠️ Пропущенные проекты: {', '.join(sorted(missing_projects))}"}
-#         return {"answer": "✅ Все проекты были успешно загружены."}
-
-#     # -------------------------------- ТАБЛИЦЫ --------------------------------
-#     if any(k in question for k in ["таблиц", "table", "какие таблицы", "что есть"]):
-#         return {"answer": f"📋 Таблицы: {', '.join(sorted(table_names))}"}
-
-#     # -------------------------------- ДИСЦИПЛИНЫ --------------------------------
-#     if any(k in question for k in ["дисциплин", "discipline", "раздел", "инженер"]):
-#         if "discipline" in df.columns and "table_name" in df.columns:
-#             rvt_df = df[df["table_name"] == "rvt_files"]
-#             disciplines = rvt_df["discipline"].dropna().unique()
-#             return {"answer": f"🛠 Дисциплины: {', '.join(sorted(disciplines))}"}
-#         else:
-#             return {"answer": "⚠️ В dataset нет таблицы 'rvt_files' или столбца 'discipline'."}
-
-
-#     # -------------------------------- ГОРОДА --------------------------------
-#     if "город" in question:
-#         city_cols = [col for col in df.columns if "city" in col.lower()]
-#         if city_cols:
-#             cities = df[city_cols[0]].dropna().unique()
-#             return {"answer": f"🏙️ Города: {', '.join(sorted(cities))}"}
-#         return {"answer": "⚠️ Столбец 'city' не найден."}
-
-#     # -------------------------------- ВЕРСИИ --------------------------------
-#     if "верси" in question:
-#         if "version_count" in df.columns:
-#             total = df["version_count"].sum()
-#             return {"answer": f"🔁 Всего версий: {int(total)}"}
-#         return {"answer": "⚠️ В dataset нет данных по версиям."}
-
-#     # -------------------------------- ДАТЫ --------------------------------
-#     if any(k in question for k in ["дата", "период", "время", "года"]):
-#         if "first_version" in df.columns and "last_version" in df.columns:
-#             min_date = pd.to_datetime(df["first_version"], errors="coerce").min().date()
-#             max_date = pd.to_datetime(df["last_version"], errors="coerce").max().date()
-#             return {"answer": f"📅 Данные от {min_date} до {max_date}"}
-#         return {"answer": "⚠️ В dataset нет информации о датах версий."}
-
-#     # -------------------------------- ПО УМОЛЧАНИЮ --------------------------------
-#     return {
-#         "answer": (
-#             "🤖 Я понимаю вопросы о проектах, координатах, дисциплинах, таблицах, городах, версиях и датах.\n"
-#             "Попробуй: 'Где находятся проекты?', 'Какие дисциплины?', 'Сколько версий?', 'Какие таблицы есть?'"
-#         )
-#     }
-
-
-# @app.on_event("startup")
-# def startup_tasks():
-#     print("🚀 Инициализация ассистента...")
-#     run_dataset_update()
-#     print("✅ dataset.csv обновлён и готов для анализа.")
+@app.on_event("startup")
+def startup_tasks():
+    print("🚀 Инициализация ассистента...")
+    chat_engine.start()  # Набор данных и ответы обновляются в фоне
 
 
+@app.on_event("shutdown")
+def stop_chat_engine():
+    chat_engine.stop()
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+
+import pandas as pd
+
+from GET_DATA.json_to_sqlite import discipline_from_file_name
+from backend.utils import generate_dataset
+from backend.utils.generate_dataset import load_dataset, load_manifest, run_dataset_update
+
+REFRESH_INTERVAL = 5 * 60  # Как часто фоновый поток проверяет базы проектов (сек)
+
+# 🔹 Темы вопросов в порядке проверки: тема -> ключевые слова
+TOPICS = [
+    ("coordinates", ["coord", "north", "east", "lat", "lon", "n/s", "e/w", "геолокац", "местоположен", "где", "координат", "расположен", "находится"]),
+    ("projects", ["назв", "перечисли", "список", "что у меня", "покажи проекты", "какие проекты"]),
+    ("project_count", None),  # «сколько» + «проект»
+    ("missing", ["почему", "не загружен", "отсутств", "пропущен", "только"]),
+    ("tables", ["таблиц", "table", "какие таблицы", "что есть"]),
+    ("disciplines", ["дисциплин", "discipline", "раздел", "инженер"]),
+    ("versions", ["верси"]),
+    ("dates", ["дата", "период", "время", "года"]),
+]
+
+DEFAULT_ANSWER = (
+    "🤖 Я понимаю вопросы о проектах, координатах, дисциплинах, таблицах, версиях и датах.\n"
+    "Попробуй: 'Где находятся проекты?', 'Какие дисциплины?', 'Сколько версий?', 'Какие таблицы есть?'"
+)
+
+
+def coordinates_answer():
+    df = load_dataset("project_coordinates", ["north_south", "east_west", "elevation", "latitude", "longitude"])
+    if df.empty:
+        return "⚠️ В наборе нет координат проектов."
+    rows = []
+    for project, group in df.groupby("project", sort=True):
+        r = group.iloc[-1]  # Последняя загруженная запись проекта
+        fields = [f"{k}={r[k]}" for k in ("north_south", "east_west", "elevation", "latitude", "longitude") if pd.notna(r[k])]
+        rows.append(f"📍 {project}: " + ", ".join(fields))
+    return "🗺️ Координаты проектов:\n" + "\n".join(rows)
+
+
+def build_answers():
+    """Все ответы считаются здесь один раз; на вопрос остаётся только выбрать готовую строку."""
+    manifest = load_manifest()["projects"]
+    dataset_projects = sorted(manifest)
+    hub_projects = set()
+    if os.path.isdir(generate_dataset.HUB_FOLDER):
+        hub_projects = {p for p in os.listdir(generate_dataset.HUB_FOLDER)
+                        if os.path.isdir(os.path.join(generate_dataset.HUB_FOLDER, p))}
+    missing = sorted(hub_projects - set(dataset_projects))
+    tables = sorted({table for info in manifest.values() for table in info["tables"]})
+
+    answers = {
+        "coordinates": coordinates_answer(),
+        "projects": f"📁 Проекты: {', '.join(dataset_projects)}" if dataset_projects else "⚠️ В наборе нет проектов.",
+        "project_count": f"📊 Всего проектов в наборе: {len(dataset_projects)}",
+        "missing": f"⚠️ Пропущенные проекты: {', '.join(missing)}" if missing else "✅ Все проекты были успешно загружены.",
+        "tables": f"📋 Таблицы: {', '.join(tables)}" if tables else "⚠️ В наборе нет таблиц.",
+    }
+
+    versions = load_dataset("rvt_files", ["file_name", "version_number", "last_modified_time"])
+    if versions.empty:
+        for topic in ("disciplines", "versions", "dates"):
+            answers[topic] = "⚠️ В наборе нет таблицы 'rvt_files'."
+        return answers
+
+    disciplines = sorted({discipline_from_file_name(name) for name in versions["file_name"].dropna().unique()})
+    answers["disciplines"] = f"🛠 Дисциплины: {', '.join(disciplines)}"
+
+    per_project = versions.groupby("project").size().sort_index()
+    answers["versions"] = f"🔁 Всего версий: {len(versions)}\n" + "\n".join(
+        f"• {project}: {count}" for project, count in per_project.items()
+    )
+
+    dates = pd.to_datetime(versions["last_modified_time"], errors="coerce", utc=True).dropna()
+    if dates.empty:
+        answers["dates"] = "⚠️ В наборе нет информации о датах версий."
+    else:
+        answers["dates"] = f"📅 Данные от {dates.min().date()} до {dates.max().date()}"
+    return answers
+
+
+def match_topic(question):
+    for topic, keywords in TOPICS:
+        if keywords is None:
+            if "сколько" in question and "проект" in question:
+                return topic
+        elif any(k in question for k in keywords):
+            return topic
+    return None
+
+
+class ChatEngine:
+    """Ответы ассистента из заранее посчитанных строк; пересчёт — только при изменении набора данных."""
+
+    def __init__(self):
+        self.answers = None
+        self.manifest_mtime = None
+        self.built_at = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def ready(self):
+        return self.answers is not None
+
+    def reload(self, force=False):
+        """Пересчитывает ответы, если изменился _manifest.json набора данных."""
+        with self._lock:
+            try:
+                mtime = os.path.getmtime(generate_dataset.MANIFEST_PATH)
+            except OSError:
+                return False
+            if not force and mtime == self.manifest_mtime:
+                return False
+            started = time.perf_counter()
+            answers = build_answers()
+            self.answers, self.manifest_mtime, self.built_at = answers, mtime, time.time()
+        print(f"🧠 Ответы ассистента пересчитаны за {time.perf_counter() - started:.2f} сек")
+        return True
+
+    def answer(self, question):
+        topic = match_topic(question.lower().strip())
+        return self.answers.get(topic, DEFAULT_ANSWER) if topic else DEFAULT_ANSWER
+
+    def _run(self):
+        while True:
+            try:
+                run_dataset_update()  # Инкрементально: без изменений в базах почти ничего не делает
+                self.reload()
+            except Exception as e:
+                print(f"❌ Ошибка обновления ассистента: {e}")
+            if self._stop.wait(REFRESH_INTERVAL):
+                return
+
+    def start(self):
+        """Фоновое обновление: сразу при запуске и затем раз в REFRESH_INTERVAL."""
+        try:
+            self.reload()  # Набор с прошлого запуска — ассистент доступен, не дожидаясь пересборки
+        except Exception as e:
+            print(f"❌ Ошибка загрузки ответов ассистента: {e}")
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+chat_engine = ChatEngine()
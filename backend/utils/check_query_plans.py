@@ -0,0 +1,124 @@
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from GET_DATA.json_to_sqlite import create_and_fill_sqlite, register_functions
+from backend.utils.db_pool import apply_schema, sqlite_uri
+from backend.utils.hub_catalog import HubCatalog
+from backend.utils.queries import CATALOG_HOT_QUERIES, FULL_LISTINGS, HOT_QUERIES, PROJECT_SCHEMA
+
+# 🔹 Регрессия планов запросов: ни один горячий запрос бэкенда не должен сканировать таблицу целиком.
+# Запуск: python -m backend.utils.check_query_plans [project_data.sqlite | hub_catalog.sqlite ...]
+# Без аргументов проверяются пустая база проекта (json_to_sqlite.create_and_fill_sqlite + схема бэкенда)
+# и каталог хаба из неё. Проверяемые базы открываются только для чтения и не меняются.
+
+# «SCAN таблица» без индекса = полный проход по таблице (FTS5 с MATCH — поиск по индексу, idxStr с «M»).
+# SQLite до 3.36 пишет «SCAN TABLE таблица ...» — разбираются оба формата
+FULL_SCAN = re.compile(
+    r"^SCAN (?:TABLE (\S+)|(?!TABLE )(\S+))(?! USING (COVERING )?INDEX| VIRTUAL TABLE INDEX \d+:\S*M)( |$)"
+)
+
+# 🔹 Строки планов обоих форматов: (строка, полный проход?) — проверяются перед базами
+PLAN_SAMPLES = [
+    ("SCAN elements", True),
+    ("SCAN TABLE elements", True),
+    ("SCAN elements USING INDEX idx_elements_view_object", False),
+    ("SCAN TABLE elements USING INDEX idx_elements_view_object", False),
+    ("SCAN TABLE views USING COVERING INDEX sqlite_autoindex_views_1", False),
+    ("SCAN search_index VIRTUAL TABLE INDEX 0:M1", False),
+    ("SCAN TABLE search_index VIRTUAL TABLE INDEX 0:M1", False),
+    ("SCAN TABLE search_index VIRTUAL TABLE INDEX 0:", True),
+    ("SEARCH TABLE elements USING INDEX idx_elements_view_object (view_id=?)", False),
+]
+
+
+def scanned_table(detail):
+    """Имя таблицы, если строка плана — полный проход по ней, иначе None."""
+    match = FULL_SCAN.match(detail)
+    return match and (match.group(1) or match.group(2))
+
+
+def full_scans(conn, sql, params, listing=None):
+    plan = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    return [row[3] for row in plan if scanned_table(row[3]) not in (None, listing)]
+
+
+def check_patterns():
+    """Разбор строк планов на образцах; возвращает строки, разобранные неверно."""
+    return [detail for detail, expected in PLAN_SAMPLES if bool(scanned_table(detail)) != expected]
+
+
+def check_database(db_path):
+    """Возвращает {имя запроса: [строки плана с полным сканированием или ошибка SQL]}; пустой список — запрос в порядке."""
+    conn = sqlite3.connect(sqlite_uri(db_path, "ro"), uri=True)
+    register_functions(conn)
+    try:
+        results = {}
+        for name, (sql, params) in hot_queries(conn).items():
+            try:
+                results[name] = full_scans(conn, sql, params, FULL_LISTINGS.get(name))
+            except sqlite3.Error as e:  # Например, старая база без столбца, который читает бэкенд
+                results[name] = [f"ошибка SQL: {e}"]
+        return results
+    finally:
+        conn.close()
+
+
+def hot_queries(conn):
+    """Каталог хаба или база проекта — по наличию таблицы catalog_projects."""
+    is_catalog = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'catalog_projects'").fetchone()
+    return CATALOG_HOT_QUERIES if is_catalog else HOT_QUERIES
+
+
+def sample_databases():
+    """Пустая база проекта со схемой бэкенда и каталог хаба, собранный из неё."""
+    hub_path = tempfile.mkdtemp()
+    project_path = os.path.join(hub_path, "project")
+    os.makedirs(project_path)
+    db_path = create_and_fill_sqlite(project_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        apply_schema(conn, PROJECT_SCHEMA)  # То же, что делает бэкенд при старте (ensure_schema)
+        conn.commit()
+    finally:
+        conn.close()
+    catalog = HubCatalog(hub_path, os.path.join(hub_path, "hub_catalog.sqlite"))
+    catalog.refresh(force=True)
+    catalog.close()
+    return [db_path, catalog.catalog_path]
+
+
+def main(paths):
+    if not paths:
+        paths = sample_databases()
+
+    failed = False
+    wrong = check_patterns()
+    if wrong:
+        failed = True
+        print(f"❌ FULL_SCAN неверно разбирает: {'; '.join(wrong)}")
+    else:
+        print(f"✅ FULL_SCAN: образцы планов ({len(PLAN_SAMPLES)})")
+    for db_path in paths:
+        print(f"🔍 {db_path}")
+        try:
+            results = check_database(db_path)
+        except sqlite3.Error as e:
+            failed = True
+            print(f"❌ Не удалось открыть базу: {e}")
+            continue
+        for name, problems in results.items():
+            if problems:
+                failed = True
+                print(f"❌ {name}: {'; '.join(problems)}")
+            else:
+                print(f"✅ {name}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
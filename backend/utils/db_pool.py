@@ -0,0 +1,255 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+# 🔹 Параметры пула
+READ_POOL_SIZE = 4      # Соединений на чтение на одну базу
+WRITE_POOL_SIZE = 1     # SQLite допускает одного писателя, остальные ждут в очереди
+ACQUIRE_TIMEOUT = 10    # Сколько секунд ждать свободное соединение
+BUSY_TIMEOUT_MS = 5000  # PRAGMA busy_timeout для соединений
+
+
+class ConnectionPool:
+    """Пул долгоживущих соединений к одному файлу SQLite (потокобезопасный)."""
+
+    def __init__(self, db_path, readonly=True, size=READ_POOL_SIZE):
+        self.db_path = os.path.abspath(db_path)
+        self.readonly = readonly
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._generation = 0
+        self._conn_generation = {}
+        self._file_id = self._stat_file_id()
+
+        # 📊 Метрики
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.resets = 0
+
+    def _stat_file_id(self):
+        try:
+            st = os.stat(self.db_path)
+        except OSError:
+            return None
+        return (st.st_dev, st.st_ino)
+
+    def _connect(self):
+        if self.readonly:
+            conn = sqlite3.connect(sqlite_uri(self.db_path, "ro"), uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        for hook in _connection_hooks:
+            hook(conn)
+        self._conn_generation[id(conn)] = self._generation
+        return conn
+
+    def refresh(self):
+        """Если файл базы пересоздан (например, json_to_sqlite.py), закрываем старые соединения."""
+        file_id = self._stat_file_id()
+        if file_id == self._file_id:
+            return
+        with self._lock:
+            if file_id == self._file_id:
+                return
+            self._file_id = file_id
+            self._generation += 1
+            self._close_idle()
+            self.resets += 1
+        _schema_ready.discard(self.db_path)
+
+    def _close_idle(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def _discard(self, conn):
+        self._conn_generation.pop(id(conn), None)
+        conn.close()
+        self._created -= 1
+
+    def acquire(self):
+        self.refresh()
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.hits += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+                self.misses += 1
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=ACQUIRE_TIMEOUT)
+        except queue.Empty:
+            raise TimeoutError(f"Нет свободного соединения к {self.db_path}")
+        with self._lock:
+            self.waits += 1
+            self.wait_time += time.perf_counter() - start
+        return conn
+
+    def release(self, conn):
+        # Соединение, открытое до пересоздания файла, в пул не возвращаем
+        if self._conn_generation.get(id(conn)) != self._generation:
+            with self._lock:
+                self._discard(conn)
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+
+    def close(self):
+        with self._lock:
+            self._close_idle()
+
+    def stats(self):
+        total = self.hits + self.misses + self.waits
+        return {
+            "readonly": self.readonly,
+            "size": self.size,
+            "open": self._created,
+            "idle": self._idle.qsize(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "waits": self.waits,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "wait_time_total_ms": round(self.wait_time * 1000, 3),
+            "wait_time_avg_ms": round(self.wait_time * 1000 / self.waits, 3) if self.waits else 0.0,
+            "resets": self.resets,
+        }
+
+
+# 🔹 Реестр пулов: по одному пулу на (файл базы, режим)
+_pools = {}
+_pools_lock = threading.Lock()
+
+# 🔹 Функции, вызываемые для каждого нового соединения (см. register_connection_hook)
+_connection_hooks = []
+
+# 🔹 Схема, которую нужно один раз создать в каждой базе (см. register_schema)
+_schema_statements = []
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def get_pool(db_path, readonly=True):
+    key = (os.path.abspath(db_path), readonly)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                size = READ_POOL_SIZE if readonly else WRITE_POOL_SIZE
+                pool = ConnectionPool(db_path, readonly=readonly, size=size)
+                _pools[key] = pool
+    return pool
+
+
+def sqlite_uri(path, mode):
+    """URI для sqlite3.connect(..., uri=True): корректен для путей Windows и имён с ? и #."""
+    return f"file:{pathname2url(os.path.abspath(path))}?mode={mode}"
+
+
+def db_version(db_path):
+    """(mtime, размер) базы и её -wal файла: в режиме WAL коммиты до checkpoint не меняют основной файл."""
+    st = os.stat(db_path)
+    try:
+        wal = os.stat(db_path + "-wal")
+        wal_version = (wal.st_mtime, wal.st_size)
+    except OSError:
+        wal_version = (None, None)
+    return (st.st_mtime, st.st_size, *wal_version)
+
+
+@contextmanager
+def connect(db_path, readonly=True):
+    """Соединение из пула. Для записи (readonly=False) схема гарантированно создана."""
+    if not readonly:
+        ensure_schema(db_path)
+    with get_pool(db_path, readonly).connection() as conn:
+        yield conn
+
+
+def register_connection_hook(hook):
+    """Регистрирует функцию hook(conn), вызываемую для каждого нового соединения (create_function и т.п.)."""
+    _connection_hooks.append(hook)
+
+
+def apply_schema(conn, statements):
+    """Выполняет DDL. Уже добавленные столбцы и таблицы, которых в этой базе ещё нет, пропускаются."""
+    for statement in statements:
+        try:
+            conn.execute(statement)
+        except sqlite3.OperationalError as e:
+            if "duplicate column" not in str(e) and "no such table" not in str(e):
+                raise
+
+
+def register_schema(*statements):
+    """Регистрирует DDL (CREATE ... IF NOT EXISTS), выполняемый один раз на базу."""
+    _schema_statements.extend(statements)
+
+
+def ensure_schema(db_path):
+    """Создаёт зарегистрированную схему в базе, если это ещё не сделано в этом процессе."""
+    db_path = os.path.abspath(db_path)
+    get_pool(db_path, readonly=False).refresh()
+    if db_path in _schema_ready:
+        return
+    with _schema_lock:
+        if db_path in _schema_ready:
+            return
+        with get_pool(db_path, readonly=False).connection() as conn:
+            apply_schema(conn, _schema_statements)
+            conn.commit()
+        _schema_ready.add(db_path)
+
+
+def pool_stats():
+    stats = {}
+    for (db_path, readonly), pool in list(_pools.items()):
+        name = os.path.basename(os.path.dirname(db_path))
+        stats.setdefault(name, {})["read" if readonly else "write"] = pool.stats()
+    return stats
+
+
+def close_all():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+    with _schema_lock:
+        _schema_ready.clear()
@@ -0,0 +1,122 @@
+import json
+import threading
+from collections import OrderedDict
+
+from backend.utils import queries
+from backend.utils.db_pool import connect, db_version
+
+DIFF_CACHE_SIZE = 32  # Сколько посчитанных сравнений держать в памяти
+CHANGE_KINDS = ("added", "removed", "modified")
+
+
+class DiffCache:
+    """LRU-кэш сравнений: ключ — (база, её версия по db_version, вид A, вид B), значение — списки изменений."""
+
+    def __init__(self, size=DIFF_CACHE_SIZE):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+diff_cache = DiffCache()
+
+
+def compute_diff(conn, view_a, view_b):
+    """{added|removed|modified: [(external_id, object_id в A, object_id в B, имя), ...]} по хэшам содержимого."""
+    for view_id in (view_a, view_b):
+        if conn.execute(queries.SELECT_MISSING_CONTENT_HASH, (view_id,)).fetchone():
+            raise LookupError("Нет хэшей содержимого — перезагрузите проект через json_to_sqlite.py")
+    result = {
+        "added": conn.execute(queries.SELECT_DIFF_ADDED, (view_b, view_a)).fetchall(),
+        "removed": conn.execute(queries.SELECT_DIFF_REMOVED, (view_a, view_b)).fetchall(),
+        "modified": conn.execute(queries.SELECT_DIFF_MODIFIED, (view_a, view_b)).fetchall(),
+    }
+    for rows in result.values():
+        # Объекты без external_id (сопоставлены по object_id) — в конце ключей, по object_id
+        rows.sort(key=lambda row: (row[0] is None, row[0] or "", row[2] if row[2] is not None else row[1]))
+    return result
+
+
+def get_diff(db_path, view_a, view_b):
+    key = (db_path, db_version(db_path), view_a, view_b)
+    diff = diff_cache.get(key)
+    if diff is None:
+        with connect(db_path) as conn:
+            diff = compute_diff(conn, view_a, view_b)
+        diff_cache.put(key, diff)
+    return diff
+
+
+def flatten_properties(raw):
+    """raw_json свойств объекта -> {(категория, имя): значение}."""
+    try:
+        obj = json.loads(raw) if raw else {}
+    except ValueError:
+        return {}
+    flat = {}
+    for category, values in (obj.get("properties") or {}).items():
+        if isinstance(values, dict):
+            for name, value in values.items():
+                flat[(category, name)] = value
+        else:
+            flat[(category, None)] = values
+    return flat
+
+
+def property_changes(old_raw, new_raw):
+    """Изменения на уровне свойств: [{category, name, old, new}, ...]."""
+    old = flatten_properties(old_raw)
+    new = flatten_properties(new_raw)
+    changes = []
+    for key in sorted(old.keys() | new.keys(), key=lambda k: (k[0], k[1] or "")):
+        if old.get(key) != new.get(key):
+            changes.append({"category": key[0], "name": key[1], "old": old.get(key), "new": new.get(key)})
+    return changes
+
+
+def diff_page(db_path, view_a, view_b, change=None, offset=0, limit=100, details=True):
+    """Страница сравнения: сводка по всем изменениям и элементы [offset, offset + limit)."""
+    diff = get_diff(db_path, view_a, view_b)
+    kinds = [change] if change else list(CHANGE_KINDS)
+    rows = [(kind, row) for kind in kinds for row in diff[kind]]
+    page = rows[offset:offset + limit]
+
+    items = []
+    with connect(db_path) as conn:
+        for kind, (external_id, object_a, object_b, name) in page:
+            item = {
+                "change": kind,
+                "external_id": external_id,
+                "name": name,
+                "from_object_id": object_a,
+                "to_object_id": object_b,
+            }
+            if details and kind == "modified":
+                old_raw = conn.execute(queries.SELECT_PROPERTY_RAW, (view_a, object_a)).fetchone()
+                new_raw = conn.execute(queries.SELECT_PROPERTY_RAW, (view_b, object_b)).fetchone()
+                item["properties"] = property_changes(old_raw and old_raw[0], new_raw and new_raw[0])
+            items.append(item)
+
+    return {
+        "summary": {kind: len(diff[kind]) for kind in CHANGE_KINDS},
+        "items": items,
+        "next_offset": offset + limit if offset + limit < len(rows) else None,
+    }
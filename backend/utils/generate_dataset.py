@@ -1,56 +1,261 @@
 import os
+import json
+import shutil
 import sqlite3
+import time
+from urllib.parse import quote
 import pandas as pd
 
+from backend.utils.db_pool import db_version, sqlite_uri
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow не установлен — набор данных не собирается
+    pa = None
+
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
 HUB_FOLDER = os.path.join(BASE_DIR, "BIMW_-_WXG_Group")
-DATASET_PATH = os.path.join(BASE_DIR, "backend", "data", "dataset.csv")
+# 🔹 Parquet с разбиением: dataset/<таблица>/project=<проект>/part-0.parquet
+DATASET_DIR = os.path.join(BASE_DIR, "backend", "data", "dataset")
+MANIFEST_PATH = os.path.join(DATASET_DIR, "_manifest.json")
+
+CHUNK_ROWS = 50_000  # Строк на один row group (таблица не читается в память целиком)
+
+# 🔹 Служебные и тяжёлые таблицы в набор не попадают (FTS5 search_index — со всеми теневыми таблицами)
+SKIP_TABLES = {"blobs", "sync_watermarks"}
+SKIP_PREFIXES = ("sqlite_", "search_index")
+
+# 🔹 raw_json не копируется — вместо него только размер (в т.ч. для сжатых в blobs)
+RAW_JSON_SIZE = "coalesce(length(raw_json), (SELECT b.size FROM blobs b WHERE b.hash = raw_hash)) AS raw_json_size"
+SKIP_COLUMNS = {"raw_json", "raw_hash"}
+
+PARQUET_TYPES = {"INTEGER": "int64", "REAL": "float64"}  # Остальное — строки
+
+
+def exported_tables(conn):
+    tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    return [t for t in tables if t not in SKIP_TABLES and not t.startswith(SKIP_PREFIXES)]
+
+
+def table_schema(conn, table):
+    """{столбец набора: тип parquet} таблицы одной базы — без raw_json/raw_hash и BLOB-столбцов."""
+    types = {}
+    info = list(conn.execute(f"PRAGMA table_info({table})"))
+    for _, name, declared, *_ in info:
+        declared = (declared or "").upper()
+        if name in SKIP_COLUMNS or declared == "BLOB":
+            continue
+        types[name] = PARQUET_TYPES.get(declared, "string")
+    if "raw_json" in {row[1] for row in info}:
+        types["raw_json_size"] = "int64"
+    return types
+
+
+def merge_schema(schema, types):
+    """Объединение схем таблицы по всем проектам; при расхождении типов столбец становится строкой."""
+    for name, kind in types.items():
+        if name not in schema:
+            schema[name] = kind
+        elif schema[name] != kind:
+            schema[name] = "string"
+
+
+def hub_schemas(databases):
+    """{таблица: общая схема} по всем базам хаба (читается только PRAGMA, без данных)."""
+    schemas = {}
+    for db_path in databases:
+        try:
+            conn = sqlite3.connect(sqlite_uri(db_path, "ro"), uri=True)
+            try:
+                for table in exported_tables(conn):
+                    merge_schema(schemas.setdefault(table, {}), table_schema(conn, table))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"❌ Ошибка чтения схемы {db_path}: {e}")
+    return schemas
+
+
+def select_list(conn, table, schema):
+    """Выражения SELECT в порядке общей схемы; столбцов, которых нет в этой базе, — NULL."""
+    names = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    has_blobs = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'blobs'").fetchone()
+    select = []
+    for name in schema:
+        if name == "raw_json_size" and "raw_json" in names:
+            select.append(RAW_JSON_SIZE if has_blobs and "raw_hash" in names else "length(raw_json) AS raw_json_size")
+        elif name in names:
+            select.append(f'"{name}"')
+        else:
+            select.append(f'NULL AS "{name}"')
+    return select
+
+
+def coerce_chunk(df, types):
+    """SQLite хранит значения любого типа в любом столбце — приводим к объявленным."""
+    for name, kind in types.items():
+        if kind == "int64":
+            df[name] = pd.to_numeric(df[name], errors="coerce").astype("Int64")
+        elif kind == "float64":
+            df[name] = pd.to_numeric(df[name], errors="coerce").astype("float64")
+        else:
+            df[name] = df[name].astype("string")
+    return df
+
+
+def write_table(conn, table, path, schema):
+    select = select_list(conn, table, schema)
+    if not select:
+        return 0
+    arrow_schema = pa.schema([(name, pa.string() if kind == "string" else getattr(pa, kind)()) for name, kind in schema.items()])
+    tmp_path = path + ".tmp"
+    rows = 0
+    writer = pq.ParquetWriter(tmp_path, arrow_schema, compression="zstd")
+    try:
+        for chunk in pd.read_sql_query(f"SELECT {', '.join(select)} FROM {table}", conn, chunksize=CHUNK_ROWS):
+            writer.write_table(pa.Table.from_pandas(coerce_chunk(chunk, schema), schema=arrow_schema, preserve_index=False))
+            rows += len(chunk)
+        if rows == 0:
+            writer.write_table(arrow_schema.empty_table())
+    finally:
+        writer.close()
+    os.replace(tmp_path, path)
+    return rows
 
-def run_dataset_update():
-    all_data = []
 
+def partition_path(table, project):
+    return os.path.join(DATASET_DIR, table, f"project={quote(project)}")
+
+
+def remove_project(project, tables):
+    for table in tables:
+        shutil.rmtree(partition_path(table, project), ignore_errors=True)
+
+
+def export_project(project, db_path, schemas, tables=None):
+    """Перезаписывает разделы проекта (все или только tables). Возвращает {таблица: строк}."""
+    counts = {}
+    conn = sqlite3.connect(sqlite_uri(db_path, "ro"), uri=True)
+    try:
+        for table in exported_tables(conn):
+            if tables is not None and table not in tables:
+                continue
+            folder = partition_path(table, project)
+            os.makedirs(folder, exist_ok=True)
+            try:
+                counts[table] = write_table(conn, table, os.path.join(folder, "part-0.parquet"), schemas[table])
+            except Exception as e:
+                print(f"❌ Ошибка при чтении таблицы {table}: {e}")
+    finally:
+        conn.close()
+    return counts
+
+
+def load_manifest():
+    """{"projects": {проект: {"version", "tables"}}, "schemas": {таблица: {столбец: тип}}}"""
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    if "projects" not in manifest:  # Пусто или формат до общих схем — полная пересборка
+        manifest = {"projects": {}, "schemas": {}}
+    return manifest
+
+
+def save_manifest(manifest):
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def run_dataset_update(force=False):
+    """Пересобирает набор только для проектов, у которых изменился project_data.sqlite (или его -wal).
+
+    Схема каждой таблицы общая для всех проектов (недостающие столбцы — null); если она
+    поменялась, таблица перезаписывается во всех проектах.
+    """
+    if pa is None:
+        print("❌ Для набора данных нужен pyarrow (pip install pyarrow)")
+        return []
+
+    os.makedirs(DATASET_DIR, exist_ok=True)
+    manifest = {"projects": {}, "schemas": {}} if force else load_manifest()
+    projects = manifest["projects"]
+    if not projects:
+        # Полная пересборка: разделы прежних запусков (в т.ч. удалённых проектов) не должны остаться
+        for name in os.listdir(DATASET_DIR):
+            if os.path.isdir(os.path.join(DATASET_DIR, name)):
+                shutil.rmtree(os.path.join(DATASET_DIR, name), ignore_errors=True)
+    started = time.perf_counter()
+    updated = []
+
+    found = {}
     for project in os.listdir(HUB_FOLDER):
-        print(f"\n🔍 Проект: {project}")
         db_path = os.path.join(HUB_FOLDER, project, "project_data.sqlite")
+        if os.path.isfile(db_path):
+            found[project] = (db_path, list(db_version(db_path)))
+
+    schemas = hub_schemas(db_path for db_path, _ in found.values())
+    stale_tables = {table for table, schema in schemas.items() if manifest["schemas"].get(table) != schema}
+    for table in set(manifest["schemas"]) - set(schemas):
+        shutil.rmtree(os.path.join(DATASET_DIR, table), ignore_errors=True)
 
-        if not os.path.isfile(db_path):
-            print("⚠️ Нет файла project_data.sqlite")
+    for project, (db_path, version) in found.items():
+        known = projects.get(project)
+        changed = not known or known["version"] != version
+        tables = None if changed else stale_tables
+        if not changed and not tables:
             continue
 
+        print(f"\n🔍 Проект: {project}" + ("" if changed else f" (новая схема: {', '.join(sorted(tables))})"))
+        if changed and known:
+            remove_project(project, known["tables"])  # Таблицы, которых больше нет, не должны остаться
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-
-            # Получаем список таблиц
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = [t[0] for t in cursor.fetchall()]
-            print(f"📋 Таблицы: {tables}")
-
-            for table in tables:
-                if table.startswith("sqlite_"):
-                    continue  # системные таблицы
-
-                cursor.execute(f"PRAGMA table_info({table})")
-                columns = [col[1] for col in cursor.fetchall()]
-                print(f"🔸 Таблица {table}: столбцы {columns}")
-
-                try:
-                    df_table = pd.read_sql_query(f"SELECT * FROM {table}", conn)
-                    df_table.insert(0, "project", project)
-                    df_table.insert(1, "table_name", table)
-                    all_data.append(df_table)
-                except Exception as e:
-                    print(f"❌ Ошибка при чтении таблицы {table}: {e}")
-
-        except Exception as e:
+            counts = export_project(project, db_path, schemas, tables)
+        except sqlite3.Error as e:
             print(f"❌ Ошибка в {project}: {e}")
-        finally:
-            conn.close()
-
-    if all_data:
-        df_final = pd.concat(all_data, ignore_index=True)
-        os.makedirs(os.path.dirname(DATASET_PATH), exist_ok=True)
-        df_final.to_csv(DATASET_PATH, index=False)
-        print(f"\n✅ dataset.csv обновлён: {len(df_final)} строк")
-    else:
-        print("\n⚠️ Нет данных для сохранения")
+            continue
+        print(f"📋 Таблицы: " + ", ".join(f"{t} ({n})" for t, n in counts.items()))
+        if not changed:
+            counts = {**known["tables"], **counts}
+        projects[project] = {"version": version, "tables": counts}
+        updated.append(project)
+
+    for project in set(projects) - set(found):
+        remove_project(project, projects.pop(project)["tables"])
+        updated.append(project)
+
+    manifest["schemas"] = schemas
+    save_manifest(manifest)
+    print(f"\n✅ Набор данных обновлён за {time.perf_counter() - started:.1f} сек: "
+          f"{', '.join(updated) if updated else 'без изменений'} -> {DATASET_DIR}")
+    return updated
+
+
+def load_dataset(table, columns=None, projects=None):
+    """DataFrame таблицы по всем (или выбранным) проектам; читаются только нужные столбцы."""
+    path = os.path.join(DATASET_DIR, table)
+    if not os.path.isdir(path):
+        return pd.DataFrame(columns=columns or [])
+    filters = [("project", "in", list(projects))] if projects else None
+    missing = []
+    if columns is not None:
+        if "project" not in columns:
+            columns = ["project", *columns]
+        # Столбца может не быть ни в одной базе хаба (старые проекты) — он возвращается пустым
+        available = set(pq.ParquetDataset(path).schema.names)
+        missing = [c for c in columns if c not in available]
+        columns = [c for c in columns if c in available]
+    df = pd.read_parquet(path, columns=columns, filters=filters)
+    for name in missing:
+        df[name] = pd.NA
+    df["project"] = df["project"].astype("string")
+    return df
+
+
+if __name__ == "__main__":
+    import sys
+    run_dataset_update(force="--force" in sys.argv)
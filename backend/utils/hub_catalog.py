@@ -0,0 +1,301 @@
+import os
+import sqlite3
+import threading
+import time
+
+from backend.utils.db_pool import connect, db_version, sqlite_uri
+
+REFRESH_INTERVAL = 5  # Раз в N секунд фоновый поток проверяет mtime баз проектов (и их -wal)
+
+# 🔹 Какие таблицы проектов копируются в каталог: таблица каталога -> (таблица проекта, столбцы)
+CATALOG_TABLES = {
+    "catalog_rvt_files": ("rvt_files", [
+        "file_name", "version_number", "last_modified_time",
+        "last_modified_user", "published_time", "published_user", "process_state",
+    ]),
+    "catalog_views": ("views", [
+        "project_name", "file_name", "version_number", "view_name", "guid",
+    ]),
+    "catalog_coordinates": ("project_coordinates", [
+        "project_name", "north_south", "east_west", "elevation", "angle_to_true_north",
+        "latitude", "longitude",
+    ]),
+    # Заполняется GET_DATA/translate_to_svf.py
+    "catalog_translation_status": ("translation_status", [
+        "file_name", "version_number", "status", "progress", "checked_at",
+    ]),
+}
+
+# 🔹 Полнотекстовый индекс хаба: копия search_index (FTS5) каждого проекта
+SEARCH_COLUMNS = [
+    "name", "props", "file_name", "version_number", "view_name", "discipline", "view_id", "object_id",
+]
+
+
+class HubCatalog:
+    """Сводная база хаба: копии «лёгких» таблиц всех проектов в одном файле.
+
+    Обновляется инкрементально — пересобираются только проекты, у которых
+    изменился project_data.sqlite или его -wal (mtime/размер, см. db_version),
+    а в поисковом индексе — только виды с новой версией строк. Обновление идёт
+    в фоновом потоке (start), запросы читают каталог как есть.
+    """
+
+    def __init__(self, hub_path, catalog_path):
+        self.hub_path = hub_path
+        self.catalog_path = catalog_path
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._conn = None
+        self.has_search = False
+        self.version = 0  # Растёт при каждом изменении каталога (ключ для кэшей поверх него)
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _writer(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.catalog_path), exist_ok=True)
+            conn = sqlite3.connect(sqlite_uri(self.catalog_path, "rwc"), uri=True, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS catalog_projects (
+                    project TEXT PRIMARY KEY,
+                    db_mtime REAL,
+                    db_size INTEGER,
+                    refreshed_at REAL
+                )
+            """)
+            # Каталоги, созданные до учёта -wal: без этих столбцов проекты просто перечитаются
+            project_columns = {row[1] for row in conn.execute("PRAGMA table_info(catalog_projects)")}
+            for column, kind in (("wal_mtime", "REAL"), ("wal_size", "INTEGER")):
+                if column not in project_columns:
+                    conn.execute(f"ALTER TABLE catalog_projects ADD COLUMN {column} {kind}")
+            schema_changed = False
+            existing_tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for table, (_, columns) in CATALOG_TABLES.items():
+                schema_changed = schema_changed or table not in existing_tables
+                conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        project TEXT,
+                        {", ".join(columns)}
+                    )
+                """)
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_project ON {table} (project)")
+                existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                for column in columns:
+                    if column not in existing:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+                        schema_changed = True
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_catalog_translation_status_version
+                ON catalog_translation_status (project, file_name, version_number)
+            """)
+            # Версия строк каждого вида в catalog_search (копия search_index_views проекта)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS catalog_search_views (
+                    project TEXT,
+                    view_id INTEGER,
+                    elements_hash TEXT,
+                    properties_hash TEXT,
+                    PRIMARY KEY (project, view_id)
+                )
+            """)
+            has_search_table = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'catalog_search'"
+            ).fetchone()
+            try:
+                conn.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS catalog_search USING fts5(
+                        name, props,
+                        project UNINDEXED, file_name UNINDEXED, version_number UNINDEXED,
+                        view_name UNINDEXED, discipline UNINDEXED, view_id UNINDEXED, object_id UNINDEXED,
+                        tokenize = 'unicode61'
+                    )
+                """)
+                self.has_search = True
+                schema_changed = schema_changed or not has_search_table
+            except sqlite3.OperationalError:
+                print("⚠️ SQLite собран без FTS5 — поиск по хабу недоступен")
+            if schema_changed:
+                # Новые таблицы или столбцы — перечитываем все проекты
+                conn.execute("DELETE FROM catalog_projects")
+                conn.execute("DELETE FROM catalog_search_views")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _scan_hub(self):
+        found = {}
+        if not os.path.isdir(self.hub_path):
+            return found
+        for project in os.listdir(self.hub_path):
+            db_path = os.path.join(self.hub_path, project, "project_data.sqlite")
+            try:
+                found[project] = (db_path, db_version(db_path))
+            except OSError:
+                continue
+        return found
+
+    def _load_project(self, conn, project, db_path, version):
+        conn.execute("ATTACH DATABASE ? AS src", (sqlite_uri(db_path, "ro"),))
+        try:
+            src_tables = {row[0] for row in conn.execute(
+                "SELECT name FROM src.sqlite_master WHERE type = 'table'"
+            )}
+            for table, (src_table, columns) in CATALOG_TABLES.items():
+                conn.execute(f"DELETE FROM {table} WHERE project = ?", (project,))
+                if src_table not in src_tables:
+                    continue
+                # Старые базы могут не содержать новых столбцов — подставляем NULL
+                src_columns = {row[1] for row in conn.execute(f"PRAGMA src.table_info({src_table})")}
+                select_list = ", ".join(c if c in src_columns else "NULL" for c in columns)
+                conn.execute(f"""
+                    INSERT INTO {table} (project, {", ".join(columns)})
+                    SELECT ?, {select_list} FROM src.{src_table}
+                """, (project,))
+            if self.has_search:
+                self._load_search(conn, project, src_tables)
+            conn.execute("""
+                INSERT INTO catalog_projects (project, db_mtime, db_size, wal_mtime, wal_size, refreshed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(project) DO UPDATE SET
+                    db_mtime = excluded.db_mtime,
+                    db_size = excluded.db_size,
+                    wal_mtime = excluded.wal_mtime,
+                    wal_size = excluded.wal_size,
+                    refreshed_at = excluded.refreshed_at
+            """, (project, *version, time.time()))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("DETACH DATABASE src")
+
+    def _load_search(self, conn, project, src_tables):
+        """Копирует в catalog_search строки search_index только тех видов, у которых сменилась версия.
+
+        Версии строк по видам — src.search_index_views (json_to_sqlite.build_search_index пишет их
+        в одной транзакции со строками индекса), в каталоге — catalog_search_views.
+        """
+        columns = ", ".join(SEARCH_COLUMNS)
+        current = {}
+        if "search_index_views" in src_tables:
+            current = {row[0]: tuple(row[1:]) for row in conn.execute(
+                "SELECT view_id, elements_hash, properties_hash FROM src.search_index_views"
+            )}
+        if not current:
+            # Старая база без версий по видам (или вовсе без search_index) — копия целиком, как раньше
+            conn.execute("DELETE FROM catalog_search WHERE project = ?", (project,))
+            conn.execute("DELETE FROM catalog_search_views WHERE project = ?", (project,))
+            if "search_index" in src_tables:
+                conn.execute(f"""
+                    INSERT INTO catalog_search (project, {columns})
+                    SELECT ?, {columns} FROM src.search_index
+                """, (project,))
+            return
+
+        known = {row[0]: tuple(row[1:]) for row in conn.execute(
+            "SELECT view_id, elements_hash, properties_hash FROM catalog_search_views WHERE project = ?", (project,)
+        )}
+        changed = [view_id for view_id, version in current.items() if known.get(view_id) != version]
+        removed = [view_id for view_id in known if view_id not in current]
+        if not changed and not removed:
+            return
+
+        if not known:
+            # Первая загрузка проекта — копия целиком
+            conn.execute("DELETE FROM catalog_search WHERE project = ?", (project,))
+            conn.execute(f"""
+                INSERT INTO catalog_search (project, {columns})
+                SELECT ?, {columns} FROM src.search_index
+            """, (project,))
+        else:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS catalog_changed_views (id INTEGER PRIMARY KEY)")
+            conn.execute("DELETE FROM catalog_changed_views")
+            conn.executemany("INSERT INTO catalog_changed_views (id) VALUES (?)", [(v,) for v in changed + removed])
+            conn.execute("""
+                DELETE FROM catalog_search
+                WHERE project = ? AND view_id IN (SELECT id FROM catalog_changed_views)
+            """, (project,))
+            conn.execute(f"""
+                INSERT INTO catalog_search (project, {columns})
+                SELECT ?, {columns} FROM src.search_index
+                WHERE view_id IN (SELECT id FROM catalog_changed_views)
+            """, (project,))
+        conn.execute("DELETE FROM catalog_search_views WHERE project = ?", (project,))
+        conn.executemany("""
+            INSERT INTO catalog_search_views (project, view_id, elements_hash, properties_hash)
+            VALUES (?, ?, ?, ?)
+        """, [(project, view_id, *version) for view_id, version in current.items()])
+        print(f"🔎 Поиск каталога, {project}: обновлено видов {len(changed)}, удалено {len(removed)}")
+
+    def refresh(self, force=False):
+        """Синхронизирует каталог с базами проектов. Возвращает список обновлённых проектов."""
+        now = time.time()
+        if not force and now - self._last_check < REFRESH_INTERVAL:
+            return []
+
+        with self._lock:
+            if not force and time.time() - self._last_check < REFRESH_INTERVAL:
+                return []
+            conn = self._writer()
+            known = {row[0]: tuple(row[1:]) for row in conn.execute(
+                "SELECT project, db_mtime, db_size, wal_mtime, wal_size FROM catalog_projects"
+            )}
+            found = self._scan_hub()
+            updated = []
+
+            for project, (db_path, version) in found.items():
+                if known.get(project) == version:
+                    continue
+                try:
+                    self._load_project(conn, project, db_path, version)
+                except sqlite3.Error as e:
+                    print(f"❌ Ошибка каталога в {project}: {e}")
+                    continue
+                updated.append(project)
+
+            for project in set(known) - set(found):
+                for table in CATALOG_TABLES:
+                    conn.execute(f"DELETE FROM {table} WHERE project = ?", (project,))
+                if self.has_search:
+                    conn.execute("DELETE FROM catalog_search WHERE project = ?", (project,))
+                conn.execute("DELETE FROM catalog_search_views WHERE project = ?", (project,))
+                conn.execute("DELETE FROM catalog_projects WHERE project = ?", (project,))
+                updated.append(project)
+
+            conn.commit()
+            self._last_check = time.time()
+            if updated:
+                self.version += 1
+
+        if updated:
+            print(f"🔄 Каталог хаба обновлён: {', '.join(updated)}")
+        return updated
+
+    def query(self, sql, params=()):
+        """Выполняет запрос к каталогу через пул соединений только для чтения (обновляет его фоновый поток)."""
+        with connect(self.catalog_path) as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def _run(self):
+        while not self._stop.wait(REFRESH_INTERVAL):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"❌ Ошибка обновления каталога хаба: {e}")
+
+    def start(self):
+        """Фоновое обновление каталога раз в REFRESH_INTERVAL — вне обработки запросов."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,234 @@
+# 🔹 SQL-запросы бэкенда к project_data.sqlite и к каталогу хаба (hub_catalog.sqlite).
+# Собраны в одном месте, чтобы check_query_plans.py проверял ровно те запросы, что выполняет main.py.
+
+# 🔹 Схема, которую бэкенд сам поддерживает в базе проекта
+PROJECT_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS project_designers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        project_name TEXT,
+        discipline TEXT,
+        first_name TEXT,
+        last_name TEXT,
+        company TEXT,
+        email TEXT,
+        phone TEXT,
+        position TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_project_designers_project ON project_designers (project_name)",
+    # Сжатые raw_json (json_to_sqlite.py): старые базы получают пустую таблицу и столбцы raw_hash
+    """
+    CREATE TABLE IF NOT EXISTS blobs (
+        hash TEXT PRIMARY KEY,
+        codec TEXT,
+        size INTEGER,
+        data BLOB
+    )
+    """,
+    "ALTER TABLE elements ADD COLUMN raw_hash TEXT",
+    "ALTER TABLE properties ADD COLUMN raw_hash TEXT",
+    # Ключ и хэш содержимого объекта для сравнения версий (/api/diff)
+    "ALTER TABLE properties ADD COLUMN external_id TEXT",
+    "ALTER TABLE properties ADD COLUMN content_hash TEXT",
+    "CREATE INDEX IF NOT EXISTS idx_properties_view_external ON properties (view_id, external_id)",
+]
+
+SELECT_DESIGNERS = """
+    SELECT id, discipline, first_name, last_name, company, email, phone, position
+    FROM project_designers
+    WHERE project_name = ?
+"""
+
+INSERT_DESIGNER = """
+    INSERT INTO project_designers (
+        project_name, discipline, first_name, last_name,
+        company, email, phone, position
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Обновляем данные, исключив проверку project_name в WHERE
+UPDATE_DESIGNER = """
+    UPDATE project_designers SET
+        discipline = ?, first_name = ?, last_name = ?,
+        company = ?, email = ?, phone = ?, position = ?
+    WHERE id = ?
+"""
+
+DELETE_DESIGNER = """
+    DELETE FROM project_designers
+    WHERE id = ? AND project_name = ?
+"""
+
+SELECT_FILES = "SELECT DISTINCT file_name FROM views"
+
+SELECT_VIEWS_3D = """
+    SELECT view_name, version_number, guid FROM views
+    WHERE file_name = ? AND role = '3d'
+"""
+
+SELECT_VIEW_ID = """
+    SELECT v.id
+    FROM views v
+    WHERE v.project_name = ? AND v.file_name = ? AND v.version_number = ? AND v.view_name = ?
+"""
+
+# raw_json строки: из самой таблицы или из blobs по raw_hash (функция raw_blob — json_to_sqlite.register_functions)
+ELEMENT_RAW_JSON = "coalesce(e.raw_json, (SELECT raw_blob(b.codec, b.data) FROM blobs b WHERE b.hash = e.raw_hash))"
+PROPERTY_RAW_JSON = "coalesce(p.raw_json, (SELECT raw_blob(b.codec, b.data) FROM blobs b WHERE b.hash = p.raw_hash))"
+
+# 🔹 Постраничная выборка (keyset по object_id) для /api/elements-by-view
+SELECT_VIEW_ELEMENTS_PAGE = f"""
+    SELECT e.object_id, e.name, {ELEMENT_RAW_JSON}, {PROPERTY_RAW_JSON}
+    FROM elements e
+    LEFT JOIN properties p
+    ON e.view_id = p.view_id AND e.object_id = p.object_id
+    WHERE e.view_id = ? AND e.object_id > ?
+    ORDER BY e.object_id
+    LIMIT ?
+"""
+
+# То же без raw_json элемента — для запросов с проекцией fields=
+SELECT_VIEW_PROPERTIES_PAGE = f"""
+    SELECT e.object_id, e.name, NULL, {PROPERTY_RAW_JSON}
+    FROM elements e
+    LEFT JOIN properties p
+    ON e.view_id = p.view_id AND e.object_id = p.object_id
+    WHERE e.view_id = ? AND e.object_id > ?
+    ORDER BY e.object_id
+    LIMIT ?
+"""
+
+# 🔹 Поиск элементов по нормализованным свойствам (json_to_sqlite.py --normalize)
+HAS_PROPERTY_VALUES = "SELECT 1 FROM property_values LIMIT 1"
+
+SELECT_PROPERTY_NAME_ID = "SELECT id FROM prop_strings WHERE value = ?"
+
+SELECT_BY_PROPERTY_TEXT = """
+    SELECT v.file_name, v.version_number, v.view_name, pv.object_id, e.name, c.value, pv.value_text
+    FROM property_values pv
+    JOIN views v ON v.id = pv.view_id
+    JOIN prop_strings c ON c.id = pv.category_id
+    LEFT JOIN elements e ON e.view_id = pv.view_id AND e.object_id = pv.object_id
+    WHERE pv.name_id = ? AND pv.value_text = ?
+    LIMIT ?
+"""
+
+SELECT_BY_PROPERTY_RANGE = """
+    SELECT v.file_name, v.version_number, v.view_name, pv.object_id, e.name, c.value, pv.value_text
+    FROM property_values pv
+    JOIN views v ON v.id = pv.view_id
+    JOIN prop_strings c ON c.id = pv.category_id
+    LEFT JOIN elements e ON e.view_id = pv.view_id AND e.object_id = pv.object_id
+    WHERE pv.name_id = ? AND pv.value_num BETWEEN ? AND ?
+    LIMIT ?
+"""
+
+# 🔹 Сравнение двух версий вида (/api/diff): объекты сопоставляются по external_id (UniqueId Revit),
+# objectid между версиями не стабилен. Объекты без external_id — по object_id (среди таких же без него).
+# Строки: (external_id, object_id в старой, object_id в новой, имя)
+SAME_OBJECT = "{a}.external_id IS {b}.external_id AND ({b}.external_id IS NOT NULL OR {a}.object_id = {b}.object_id)"
+
+SELECT_DIFF_ADDED = f"""
+    SELECT b.external_id, NULL, b.object_id, e.name
+    FROM properties b
+    LEFT JOIN elements e ON e.view_id = b.view_id AND e.object_id = b.object_id
+    WHERE b.view_id = ? AND NOT EXISTS (
+        SELECT 1 FROM properties a WHERE a.view_id = ? AND {SAME_OBJECT.format(a="a", b="b")}
+    )
+"""
+
+SELECT_DIFF_REMOVED = f"""
+    SELECT a.external_id, a.object_id, NULL, e.name
+    FROM properties a
+    LEFT JOIN elements e ON e.view_id = a.view_id AND e.object_id = a.object_id
+    WHERE a.view_id = ? AND NOT EXISTS (
+        SELECT 1 FROM properties b WHERE b.view_id = ? AND {SAME_OBJECT.format(a="b", b="a")}
+    )
+"""
+
+SELECT_DIFF_MODIFIED = f"""
+    SELECT b.external_id, a.object_id, b.object_id, e.name
+    FROM properties b
+    JOIN properties a ON a.view_id = ? AND {SAME_OBJECT.format(a="a", b="b")}
+    LEFT JOIN elements e ON e.view_id = b.view_id AND e.object_id = b.object_id
+    WHERE b.view_id = ? AND a.content_hash IS NOT b.content_hash
+"""
+
+SELECT_MISSING_CONTENT_HASH = "SELECT 1 FROM properties WHERE view_id = ? AND content_hash IS NULL LIMIT 1"
+
+SELECT_PROPERTY_RAW = f"""
+    SELECT {PROPERTY_RAW_JSON}
+    FROM properties p
+    WHERE p.view_id = ? AND p.object_id = ?
+"""
+
+# 🔹 Горячие запросы: имя -> (SQL, пример параметров). Ни один не должен сканировать таблицу целиком.
+HOT_QUERIES = {
+    "designers": (SELECT_DESIGNERS, ("project",)),
+    "update_designer": (UPDATE_DESIGNER, ("", "", "", "", "", "", "", 1)),
+    "delete_designer": (DELETE_DESIGNER, (1, "project")),
+    "files_by_project": (SELECT_FILES, ()),
+    "views_3d": (SELECT_VIEWS_3D, ("file.rvt",)),
+    "view_id": (SELECT_VIEW_ID, ("project", "file.rvt", 1, "{3D}")),
+    "elements_page": (SELECT_VIEW_ELEMENTS_PAGE, (1, 0, 1000)),
+    "properties_page": (SELECT_VIEW_PROPERTIES_PAGE, (1, 0, 1000)),
+    "has_property_values": (HAS_PROPERTY_VALUES, ()),
+    "property_name_id": (SELECT_PROPERTY_NAME_ID, ("Fire Rating",)),
+    "by_property_text": (SELECT_BY_PROPERTY_TEXT, (1, "2h", 100)),
+    "by_property_range": (SELECT_BY_PROPERTY_RANGE, (1, 0, 10, 100)),
+    "diff_added": (SELECT_DIFF_ADDED, (2, 1)),
+    "diff_removed": (SELECT_DIFF_REMOVED, (1, 2)),
+    "diff_modified": (SELECT_DIFF_MODIFIED, (1, 2)),
+    "diff_missing_hash": (SELECT_MISSING_CONTENT_HASH, (1,)),
+    "property_raw": (SELECT_PROPERTY_RAW, (1, 1)),
+}
+
+# 🔹 Запросы к каталогу хаба (hub_catalog.py)
+SELECT_CATALOG_COORDINATES = """
+    SELECT project_name, north_south, east_west, elevation, angle_to_true_north,
+           latitude, longitude
+    FROM catalog_coordinates
+"""
+
+SELECT_CATALOG_RVT_FILES = """
+    SELECT f.project, f.file_name, f.version_number, f.last_modified_time,
+           f.last_modified_user, f.published_time, f.published_user, f.process_state,
+           t.status, t.checked_at
+    FROM catalog_rvt_files f
+    LEFT JOIN catalog_translation_status t
+        ON t.project = f.project AND t.file_name = f.file_name AND t.version_number = f.version_number
+"""
+
+SELECT_CATALOG_VIEWS = """
+    SELECT project, file_name, version_number, view_name, guid
+    FROM catalog_views
+"""
+
+SEARCH_CATALOG = """
+    SELECT project, file_name, version_number, view_name, discipline, object_id, name,
+           snippet(catalog_search, -1, '[', ']', '…', 10)
+    FROM catalog_search
+    WHERE catalog_search MATCH ?
+      AND (? IS NULL OR project = ?)
+      AND (? IS NULL OR file_name = ?)
+      AND (? IS NULL OR version_number = ?)
+      AND (? IS NULL OR discipline = ?)
+    ORDER BY rank
+    LIMIT ? OFFSET ?
+"""
+
+# Списочные эндпоинты отдают таблицу каталога целиком: для них допустим SCAN этой таблицы
+# (как она названа в плане), но не остальных таблиц запроса
+CATALOG_HOT_QUERIES = {
+    "coordinates": (SELECT_CATALOG_COORDINATES, ()),
+    "projects_table": (SELECT_CATALOG_RVT_FILES, ()),
+    "views_table": (SELECT_CATALOG_VIEWS, ()),
+    "search": (SEARCH_CATALOG, ('"wall"*', None, None, None, None, None, None, None, None, 50, 0)),
+}
+
+FULL_LISTINGS = {
+    "coordinates": "catalog_coordinates",
+    "projects_table": "f",
+    "views_table": "catalog_views",
+}